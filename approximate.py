@@ -0,0 +1,179 @@
+"""
+Approximate Aggregates
+Estimates sums and ROAS with confidence intervals from the stratified
+sample kept at ingest, in time that does not grow with rows per day
+"""
+
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from campaign_query import CampaignQuery
+from metrics import MEASURES, total
+from sql_analysis import DB_PATH
+
+# Normal quantile for the reported intervals (95%)
+Z = 1.96
+
+STRATA = ['month', 'channel']
+
+SAMPLE_QUERY = """
+    SELECT s.*, p.stratum_rows
+    FROM sample_campaigns s
+    CROSS JOIN (SELECT month, channel, SUM(n_rows) as stratum_rows
+                FROM rollup_monthly_channel GROUP BY month, channel) p
+    ON p.month = s.month AND p.channel = s.channel
+"""
+
+
+def load_sample(db_path=DB_PATH):
+    """Sample rows with their stratum's population and sample sizes
+
+    The frame is marked as a cube, so it can be passed straight to the
+    chart functions, and as a sample, so their roll-ups become estimates.
+    """
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        sample = pd.read_sql_query(SAMPLE_QUERY, conn)
+    finally:
+        conn.close()
+    sample['sample_rows'] = sample.groupby(STRATA)['date'].transform('size')
+    sample.attrs['cube'] = True
+    sample.attrs['sample'] = True
+    return sample
+
+
+def domain_mask(sample, start=None, end=None, **filters):
+    """Sample rows inside a date range and dimension filters"""
+
+    mask = pd.Series(True, index=sample.index)
+    if start:
+        mask &= sample['date'] >= start
+    if end:
+        mask &= sample['date'] <= (end if len(end) > 7 else f"{end}-31")
+    for name, values in filters.items():
+        if values:
+            mask &= sample[name].isin([values] if isinstance(values, str) else values)
+    return mask
+
+
+def stratum_variance(sums, squares, n):
+    """Sample variance within a stratum from the sum and sum of squares over its n rows"""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = (squares - sums ** 2 / n) / (n - 1)
+    return np.where(n > 1, np.maximum(variance, 0.0), 0.0)
+
+
+def estimate(sample, dimensions=(), z=Z, **filters):
+    """Estimated totals and ROAS per group, each with _low and _high bounds
+
+    Uses the stratified estimator: each stratum's sample mean is scaled up
+    by its exact row count, and the variance includes the finite population
+    correction, so fully sampled strata add no uncertainty. Rows outside
+    the filters count as zeros rather than being dropped, which keeps the
+    estimator unbiased for any slice. ROAS is a ratio estimator, with its
+    variance from the linearized residuals revenue - ROAS * spend.
+    """
+
+    dimensions = list(dimensions)
+    keys = STRATA + [d for d in dimensions if d not in STRATA]
+    mask = domain_mask(sample, **filters)
+
+    values = sample[MEASURES].where(mask, 0.0).astype(float)
+    rows = values.assign(**{f"{m}_sq": values[m] ** 2 for m in MEASURES},
+                         revenue_spend=values['revenue'] * values['spend'],
+                         hits=mask.astype(int))
+    cells = rows.groupby([sample[k] for k in keys], observed=True).sum()
+
+    # Every stratum contributes to every group, even where none of the group's
+    # rows were sampled, so rebuild cells over the full strata x group grid
+    strata = sample.groupby(STRATA, observed=True)[['stratum_rows', 'sample_rows']].first()
+    groups = cells.index.droplevel(STRATA).unique() if len(keys) > len(STRATA) else None
+    if groups is not None:
+        grid = pd.MultiIndex.from_tuples([s + (g if isinstance(g, tuple) else (g,))
+                                          for s in strata.index for g in groups], names=keys)
+        cells = cells.reindex(grid, fill_value=0.0)
+    cells = cells.join(strata)
+
+    n = cells['sample_rows'].to_numpy(float)
+    N = cells['stratum_rows'].to_numpy(float)
+    weight = N / n
+    variance_weight = N ** 2 * (1 - n / N) / n
+
+    group_keys = [cells.index.get_level_values(d) for d in dimensions] or np.zeros(len(cells))
+    parts = pd.DataFrame(index=cells.index)
+    for m in MEASURES:
+        parts[m] = weight * cells[m]
+        parts[f"{m}_var"] = variance_weight * stratum_variance(cells[m], cells[f"{m}_sq"], n)
+    parts['hits'] = cells['hits']
+    totals = parts.groupby(group_keys, observed=True).sum()
+
+    # Ratio estimator for ROAS, with residuals d = revenue - roas * spend
+    roas = total('roas', totals)
+    if len(dimensions) > 1:
+        ratio = roas.reindex(pd.MultiIndex.from_arrays(group_keys)).to_numpy()
+    elif dimensions:
+        ratio = roas.reindex(group_keys[0]).to_numpy()
+    else:
+        ratio = np.full(len(cells), roas.iloc[0])
+    ratio = np.nan_to_num(ratio)
+    d_sum = cells['revenue'] - ratio * cells['spend']
+    d_squares = cells['revenue_sq'] - 2 * ratio * cells['revenue_spend'] + ratio ** 2 * cells['spend_sq']
+    parts['d_var'] = variance_weight * stratum_variance(d_sum, d_squares, n)
+    roas_se = np.sqrt(parts.groupby(group_keys, observed=True)['d_var'].sum()) / totals['spend']
+
+    result = pd.DataFrame(index=totals.index)
+    for m in MEASURES:
+        margin = z * np.sqrt(totals[f"{m}_var"])
+        result[m] = totals[m]
+        result[f"{m}_low"] = totals[m] - margin
+        result[f"{m}_high"] = totals[m] + margin
+    result['roas'] = roas
+    result['roas_low'] = roas - z * roas_se
+    result['roas_high'] = roas + z * roas_se
+
+    result = result[totals['hits'] > 0]
+    if not dimensions:
+        return result.reset_index(drop=True)
+    result.index.names = dimensions
+    return result.reset_index()
+
+
+def main(argv=None):
+    """Print estimates for a slice, optionally next to the exact values"""
+
+    parser = argparse.ArgumentParser(description="Approximate campaign totals and ROAS with 95% intervals")
+    parser.add_argument('--dimension', action='append', default=[],
+                        choices=['month', 'channel', 'campaign_type', 'product'])
+    parser.add_argument('--start', help="first date (YYYY-MM-DD or YYYY-MM)")
+    parser.add_argument('--end', help="last date (YYYY-MM-DD or YYYY-MM)")
+    parser.add_argument('--channel', action='append')
+    parser.add_argument('--campaign-type', action='append')
+    parser.add_argument('--product', action='append')
+    parser.add_argument('--exact', action='store_true', help="also compute the exact values")
+    args = parser.parse_args(argv)
+
+    filters = dict(start=args.start, end=args.end, channel=args.channel,
+                   campaign_type=args.campaign_type, product=args.product)
+
+    start = time.time()
+    sample = load_sample()
+    estimates = estimate(sample, args.dimension, **filters)
+    print(f"≈ Estimated from {len(sample):,} sampled rows in {(time.time() - start) * 1000:.0f} ms\n")
+    columns = args.dimension + ['revenue', 'revenue_low', 'revenue_high', 'roas', 'roas_low', 'roas_high']
+    print(estimates[columns].round(2).to_string(index=False))
+
+    if args.exact:
+        with CampaignQuery() as query:
+            exact = query.slice(dimensions=args.dimension, metrics=['revenue', 'roas'], **filters)
+        print("\n🎯 Exact")
+        print(exact.round(2).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Pipeline Benchmark
+Times generation, ingestion, the reports and the charts at several data
+scales, and flags regressions against a stored baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# Scale name -> generator rows per channel per day (12 channels x 488 days)
+SCALES = {
+    '10k': 2,
+    '1m': 171,
+    '10m': 1708,
+}
+
+DEFAULT_SCALES = ['10k', '1m']
+
+# Stages run in order, each in a fresh process so its peak RSS is its own
+STAGES = ['generate', 'ingest', 'queries', 'charts']
+
+WORK_DIR = 'benchmarks/work'
+RESULTS_PATH = 'benchmarks/results.json'
+BASELINE_PATH = 'benchmarks/baseline.json'
+
+# Relative slowdown (or memory growth) counted as a regression
+DEFAULT_THRESHOLD = 0.20
+
+# Timings shorter than this are too noisy to compare
+MIN_SECONDS = 0.05
+
+# Each timing is the fastest of up to REPEATS calls, stopping once a measure
+# has run for REPEAT_SECONDS, so slow stages still run only once
+REPEATS = 5
+REPEAT_SECONDS = 2.0
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def timed(fn, *args, **kwargs):
+    """(result, seconds) for the fastest of up to REPEATS calls
+
+    The minimum is the least noisy estimate of a call's cost: scheduling
+    and cache effects only ever add time.
+    """
+
+    best = spent = 0.0
+    for attempt in range(REPEATS):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        best = seconds if attempt == 0 else min(best, seconds)
+        spent += seconds
+        if spent >= REPEAT_SECONDS:
+            break
+    return result, best
+
+
+def run_generate(rows_per_day):
+    """Write the CSV with the streaming generator, as a load test would"""
+
+    from generate_marketing_data import OUTPUT_PATH, stream_marketing_data
+
+    _, seconds = timed(stream_marketing_data, rows_per_day=rows_per_day)
+    with open(OUTPUT_PATH) as f:
+        rows = sum(1 for _ in f) - 1
+    return {'rows': rows, 'seconds': seconds}
+
+
+def run_ingest(rows_per_day):
+    """Load the CSV into a fresh SQLite database"""
+
+    import sqlite3
+
+    from sql_analysis import DB_PATH, create_database
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    _, seconds = timed(create_database)
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]
+    return {'rows': rows, 'seconds': seconds}
+
+
+def run_queries(rows_per_day):
+    """Time each report query on its own, without the result cache"""
+
+    from sql_analysis import REPORTS, QueryExecutor
+
+    timings = {}
+    with QueryExecutor(max_workers=1) as executor:
+        for name, sql in REPORTS.items():
+            _, timings[name] = timed(executor.query, sql)
+    return {'seconds': sum(timings.values()), 'queries': timings}
+
+
+def run_charts(rows_per_day):
+    """Load the data, build the cube and time each chart function"""
+
+    import create_dashboard as dashboard
+
+    os.makedirs(dashboard.DASHBOARD_DIR, exist_ok=True)
+    df, load_seconds = timed(dashboard.load_data)
+    cube, cube_seconds = timed(dashboard.build_cube, df)
+    daily, daily_seconds = timed(dashboard.daily_channel_series, df)
+
+    timings = {'load_data': load_seconds, 'build_cube': cube_seconds,
+               'daily_channel_series': daily_seconds}
+    for create_chart in list(dashboard.CHARTS.values()):
+        _, timings[create_chart.__name__] = timed(create_chart, cube)
+    _, timings['create_daily_trend_chart'] = timed(dashboard.create_daily_trend_chart, daily)
+    return {'rows': len(df), 'seconds': sum(timings.values()), 'charts': timings}
+
+
+STAGE_FUNCTIONS = {
+    'generate': run_generate,
+    'ingest': run_ingest,
+    'queries': run_queries,
+    'charts': run_charts,
+}
+
+
+def run_stage(stage, work_dir, rows_per_day):
+    """Run one stage in a child process; returns its result with peak RSS"""
+
+    os.makedirs(os.path.join(work_dir, 'data'), exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')]))}
+    completed = subprocess.run(
+        [sys.executable, os.path.join(here, 'benchmark.py'), '--stage', stage,
+         '--rows-per-day', str(rows_per_day)],
+        cwd=work_dir, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise RuntimeError(f"Stage {stage} failed with exit code {completed.returncode}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def stage_main(stage, rows_per_day):
+    """Child process entry point: run the stage quietly, print its result as JSON"""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = STAGE_FUNCTIONS[stage](rows_per_day)
+    result['peak_rss_mb'] = peak_rss_mb()
+    if result.get('rows'):
+        result['rows_per_sec'] = result['rows'] / result['seconds']
+    print(json.dumps(result))
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, work_dir=WORK_DIR):
+    """Results for every stage at every scale"""
+
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU(s)",
+        'scales': {},
+    }
+    for scale in scales:
+        print(f"\n📏 Scale {scale} ({SCALES[scale]} rows per channel per day)")
+        scale_dir = os.path.join(work_dir, scale)
+        results['scales'][scale] = {}
+        for stage in STAGES:
+            result = run_stage(stage, scale_dir, SCALES[scale])
+            results['scales'][scale][stage] = result
+            throughput = f", {result['rows_per_sec']:,.0f} rows/sec" if 'rows_per_sec' in result else ''
+            print(f"   {stage:<10}{result['seconds']:8.2f}s  {result['peak_rss_mb']:7.0f} MB peak{throughput}")
+    return results
+
+
+def flatten(results):
+    """'scale/stage/measure' -> value for the comparable numbers in a result set"""
+
+    flat = {}
+    for scale, stages in results['scales'].items():
+        for stage, result in stages.items():
+            flat[f"{scale}/{stage}/seconds"] = result['seconds']
+            flat[f"{scale}/{stage}/peak_rss_mb"] = result['peak_rss_mb']
+            for group in ('queries', 'charts'):
+                for name, seconds in result.get(group, {}).items():
+                    flat[f"{scale}/{stage}/{name}"] = seconds
+    return flat
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """(key, baseline, current, change) for every measure worse than the threshold"""
+
+    current, before = flatten(results), flatten(baseline)
+    regressions = []
+    for key, value in current.items():
+        old = before.get(key)
+        if old is None or (not key.endswith('peak_rss_mb') and max(old, value) < MIN_SECONDS):
+            continue
+        change = value / old - 1 if old else 0.0
+        if change > threshold:
+            regressions.append((key, old, value, change))
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmarks, save the results and check them against the baseline"""
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline at several data scales")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=DEFAULT_SCALES)
+    parser.add_argument('--work-dir', default=WORK_DIR, help="scratch directory for generated data")
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON results path")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="JSON baseline to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown counted as a regression (default: 0.20)")
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--rows-per-day', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage:
+        return stage_main(args.stage, args.rows_per_day)
+
+    print("⏱️  Running pipeline benchmarks...")
+    results = run_benchmarks(args.scales, os.path.abspath(args.work_dir))
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️  No baseline yet; rerun with --save-baseline to store one")
+        return
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+        return
+
+    print(f"\n⚠️  {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for key, old, value, change in regressions:
+        print(f"   {key}: {old:,.3f} -> {value:,.3f} (+{change:.0%})")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Campaign Data Loader
+Shared typed schema and readers for the campaign CSV
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from metrics import DERIVED_COLUMNS, MEASURES, add_derived_columns
+
+CSV_PATH = 'data/marketing_campaigns.csv'
+
+# Narrow in-memory types for analysis. Dimensions are categoricals, counts
+# fit comfortably in int32, and the rounded per-row ratios lose nothing at
+# float32. Money columns stay float64 because they are summed.
+SCHEMA = {
+    'date': 'category',  # parsed to datetime64 once per distinct value
+    'channel': 'category',
+    'campaign_type': 'category',
+    'product': 'category',
+    'impressions': 'int32',
+    'clicks': 'int32',
+    'conversions': 'int32',
+    'spend': 'float64',
+    'revenue': 'float64',
+    'ctr': 'float32',
+    'conversion_rate': 'float32',
+    'cac': 'float32',
+    'roas': 'float32',
+    'profit': 'float64',
+}
+
+# Full-precision types for copying rows into storage unchanged; dates stay text
+STORAGE_SCHEMA = {
+    **SCHEMA,
+    'date': str,
+    'ctr': 'float64',
+    'conversion_rate': 'float64',
+    'cac': 'float64',
+    'roas': 'float64',
+}
+
+# Columnar cache layout: every column at storage precision, dimensions and
+# dates as categorical codes, so reads can be memory-mapped without parsing
+CACHE_SCHEMA = {**STORAGE_SCHEMA, 'date': 'category'}
+
+# Columns narrowed from the cached float64 to the analysis schema on load
+NARROWED_COLUMNS = [c for c in SCHEMA if SCHEMA[c] != CACHE_SCHEMA[c] and c != 'date']
+
+
+def read_campaign_chunks(path=CSV_PATH, chunksize=100_000, columns=None, names=None,
+                         schema=STORAGE_SCHEMA):
+    """Read the CSV in fixed-size chunks with explicit column types
+
+    path may be an open file; pass the header as names when reading from a
+    position past the header line.
+    """
+
+    columns = list(columns or schema)
+    return pd.read_csv(path, usecols=columns, dtype={c: schema[c] for c in columns},
+                       chunksize=chunksize, names=names, header=None if names else 'infer')
+
+
+def load_campaigns(columns=None, path=CSV_PATH, use_cache=True):
+    """Load campaign data with the analysis schema, reading only the given columns
+
+    Columns come from the memory-mapped columnar cache next to the CSV; the
+    first load after the CSV changes parses it once and rebuilds the cache.
+    Derived columns missing from a compact CSV are computed from the base
+    measures.
+    """
+
+    columns = list(columns or SCHEMA)
+
+    if not use_cache:
+        stored, derived = split_derived(columns, csv_columns(path))
+        df = pd.read_csv(path, usecols=stored, dtype={c: SCHEMA[c] for c in stored})
+    else:
+        cached = read_column_cache(path) or build_column_cache(path)
+        stored, derived = split_derived(columns, cached[1]['columns'])
+        df = cached_frame(*cached, stored)
+
+    if 'date' in df:
+        df['date'] = parse_dates(df['date'])
+    if derived:
+        df = add_derived_columns(df)
+    for name in NARROWED_COLUMNS:
+        if name in df:
+            df[name] = df[name].astype(SCHEMA[name])
+    return df[columns]
+
+
+def split_derived(columns, available):
+    """(columns to read, derived columns to compute) for a request
+
+    Derived columns the data does not hold are swapped for the measures
+    they are computed from.
+    """
+
+    derived = [c for c in columns if c in DERIVED_COLUMNS and c not in available]
+    if not derived:
+        return columns, []
+    stored = [c for c in columns if c not in derived]
+    return stored + [m for m in MEASURES if m not in stored], derived
+
+
+def csv_columns(path=CSV_PATH):
+    """Column names from the CSV header"""
+
+    with open(path) as f:
+        return f.readline().rstrip('\r\n').split(',')
+
+
+def cache_dir_for(path=CSV_PATH):
+    """Cache directory for a CSV: data/.cache/<csv name>/"""
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path) or '.', '.cache', name)
+
+
+def csv_signature(path=CSV_PATH):
+    """Size and modification time that a cache must match to be valid"""
+
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_column_cache(path=CSV_PATH):
+    """(cache_dir, manifest) for a valid cache, or None when missing or stale"""
+
+    cache_dir = cache_dir_for(path)
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if manifest.get('source') != csv_signature(path):
+        return None
+    return cache_dir, manifest
+
+
+def build_column_cache(path=CSV_PATH):
+    """Parse the CSV once and write its columnar cache"""
+
+    # Signature taken first, so a CSV rewritten mid-parse leaves a stale cache
+    signature = csv_signature(path)
+    header = csv_columns(path)
+    columns = [c for c in CACHE_SCHEMA if c in header]
+    df = pd.read_csv(path, usecols=columns, dtype={c: CACHE_SCHEMA[c] for c in columns})
+    return write_column_cache(df[columns], path, signature)
+
+
+def write_column_cache(df, path=CSV_PATH, signature=None):
+    """Write each column as a .npy file plus a manifest tied to the CSV's signature"""
+
+    cache_dir = cache_dir_for(path)
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    manifest = {'source': signature or csv_signature(path), 'rows': len(df), 'columns': {}}
+    for name in df.columns:
+        column = df[name].astype(CACHE_SCHEMA[name])
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Sorted categories: chronological dates and a stable chart order
+            column = column.cat.reorder_categories(sorted(column.cat.categories))
+            values = column.cat.codes.to_numpy()
+            manifest['columns'][name] = {'categories': [str(c) for c in column.cat.categories]}
+        else:
+            values = column.to_numpy()
+            manifest['columns'][name] = {}
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    # Swap the new cache in, moving any old one aside first
+    old_dir = f"{cache_dir}.old-{os.getpid()}"
+    if os.path.exists(cache_dir):
+        os.replace(cache_dir, old_dir)
+    os.replace(tmp_dir, cache_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return cache_dir, manifest
+
+
+def cached_frame(cache_dir, manifest, columns, rows=slice(None)):
+    """DataFrame over memory-mapped cache columns, without copying numeric data"""
+
+    data = {}
+    for name in columns:
+        values = np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode='r')[rows]
+        meta = manifest['columns'][name]
+        if 'categories' in meta:
+            values = pd.Categorical.from_codes(values, meta['categories'], ordered=(name == 'date'))
+        data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def cached_chunks(cache_dir, manifest, chunksize=100_000, columns=None):
+    """Storage-precision chunks from a cache, with dates as ordered text categories"""
+
+    columns = list(columns or manifest['columns'])
+    for start in range(0, manifest['rows'], chunksize):
+        yield cached_frame(cache_dir, manifest, columns, slice(start, start + chunksize))
+
+
+def parse_dates(dates):
+    """Parse a categorical date column to datetime64, one parse per distinct date"""
+
+    categories = pd.to_datetime(dates.cat.categories, format='%Y-%m-%d')
+    return pd.Series(np.asarray(categories)[dates.cat.codes], index=dates.index, name=dates.name)
@@ -0,0 +1,205 @@
+"""
+Campaign Query
+Ad-hoc slices of the campaign data, compiled to parameterized SQL over the
+narrowest table that can answer them
+"""
+
+import calendar
+
+from metrics import DERIVED_COLUMNS, MEASURES, total_sql
+from sql_analysis import DB_PATH, QueryExecutor
+
+DIMENSIONS = ['date', 'month', 'channel', 'campaign_type', 'product']
+
+# Metrics as SQL over summed measures; ratios are computed from the sums,
+# never averaged per row
+METRICS = {
+    'rows': "SUM(n_rows)",
+    **{name: total_sql(name) for name in MEASURES + DERIVED_COLUMNS},
+}
+
+DEFAULT_METRICS = ['spend', 'revenue', 'roas', 'cac']
+
+# Tables in order of preference: (table, dimensions it holds, date column,
+# month granularity). The raw table is the fallback for any slice.
+SOURCES = [
+    ('rollup_monthly_channel', {'month', 'channel'}, 'month', True),
+    ('rollup_monthly_segment', {'month', 'channel', 'campaign_type', 'product'}, 'month', True),
+    ('rollup_daily_channel', {'date', 'month', 'channel'}, 'date', False),
+    ('campaigns', set(DIMENSIONS), 'date', False),
+]
+
+# Filterable columns besides the date range
+FILTERS = ['channel', 'campaign_type', 'product']
+
+
+def whole_months(start, end):
+    """True when [start, end] covers only whole calendar months"""
+    return month_range(start, end) == (start and start[:7], end and end[:7])
+
+
+def month_range(start, end):
+    """(first, last) whole months inside [start, end]; None for an open end"""
+
+    first = start and start[:7]
+    if start and start[8:] not in ('', '01'):
+        first = shift_month(first, 1)
+
+    last = end and end[:7]
+    if end and len(end) > 7:
+        year, month = int(end[:4]), int(end[5:7])
+        if int(end[8:]) != calendar.monthrange(year, month)[1]:
+            last = shift_month(last, -1)
+    return first, last
+
+
+def shift_month(month, n):
+    """'YYYY-MM' moved by n months"""
+
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + n
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def choose_source(dimensions, filters, start, end):
+    """Smallest table holding every dimension and filter at the needed date grain"""
+
+    needed = set(dimensions) | {name for name in FILTERS if filters.get(name)}
+    for table, columns, date_column, monthly in SOURCES:
+        if needed <= columns and (not monthly or whole_months(start, end)):
+            return table, date_column, monthly
+    raise ValueError(f"No source can answer dimensions {sorted(needed)}")
+
+
+def filter_clauses(filters):
+    """WHERE clauses and parameters for the dimension filters"""
+
+    clauses, params = [], []
+    for name in FILTERS:
+        values = filters.get(name)
+        if not values:
+            continue
+        values = [values] if isinstance(values, str) else list(values)
+        clauses.append(f"{name} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    return clauses, params
+
+
+def blended_source(start, end, clauses, params):
+    """Subquery over whole months from the segment rollup plus raw rows for
+    the partial months at either end, or None when no whole month is covered
+    """
+
+    first, last = month_range(start, end)
+    if first and last and first > last:
+        return None
+
+    measures = ', '.join(MEASURES)
+    branches, branch_params = [], []
+
+    def branch(select, table, conditions, values):
+        where = ' AND '.join(conditions + clauses)
+        branches.append(f"SELECT {select}, {measures} FROM {table}" + (f" WHERE {where}" if where else ''))
+        branch_params.extend(values + params)
+
+    months = [c for c, v in [("month >= ?", first), ("month <= ?", last)] if v]
+    branch("month, channel, campaign_type, product, n_rows", 'rollup_monthly_segment',
+           months, [v for v in (first, last) if v])
+
+    raw = "strftime('%Y-%m', date) as month, channel, campaign_type, product, 1 as n_rows"
+    if start and first != start[:7]:
+        branch(raw, 'campaigns', ["date >= ?", "date < ?"], [start, f"{first}-01"])
+    if end and last != end[:7]:
+        branch(raw, 'campaigns', ["date >= ?", "date <= ?"], [f"{end[:7]}-01", end])
+
+    return f"({' UNION ALL '.join(branches)})", branch_params
+
+
+def compile_query(start=None, end=None, dimensions=(), metrics=None, order_by=None, **filters):
+    """(sql, params) for a slice
+
+    start and end are inclusive 'YYYY-MM-DD' dates (or 'YYYY-MM' months);
+    channel, campaign_type and product filters take a value or a list of
+    values. Values are always bound as parameters, so each query shape
+    compiles to the same statement text and reuses SQLite's prepared
+    statement cache.
+    """
+
+    dimensions = list(dimensions)
+    metrics = list(metrics or DEFAULT_METRICS)
+    unknown = [f for f in filters if f not in FILTERS] + \
+              [d for d in dimensions if d not in DIMENSIONS] + \
+              [m for m in metrics if m not in METRICS] + \
+              [o for o in [order_by] if o and o not in metrics + dimensions]
+    if unknown:
+        raise ValueError(f"Unknown filters, dimensions or metrics: {unknown}")
+
+    table, date_column, monthly = choose_source(dimensions, filters, start, end)
+    where, params = filter_clauses(filters)
+
+    # Ragged date ranges only need raw rows for their partial months
+    blended = None
+    if table == 'campaigns' and 'date' not in dimensions:
+        blended = blended_source(start, end, where, params)
+    if blended:
+        (table, params), where, monthly = blended, [], True
+    else:
+        dates, date_params = [], []
+        if start:
+            dates.append(f"{date_column} >= ?")
+            date_params.append(start[:7] if monthly else start)
+        if end:
+            # A bare 'YYYY-MM' end includes every day of that month
+            dates.append(f"{date_column} <= ?")
+            date_params.append(end[:7] if monthly else (end if len(end) > 7 else f"{end}-31"))
+        where, params = dates + where, date_params + params
+
+    # The raw table has one row per record, not an n_rows count
+    metric_sql = {**METRICS, 'rows': "COUNT(*)"} if table == 'campaigns' else METRICS
+    dimension_sql = {'month': "month" if monthly else "strftime('%Y-%m', date)"}
+    select = [f"{dimension_sql.get(d, d)} as {d}" for d in dimensions]
+    select += [f"{metric_sql[m]} as {m}" for m in metrics]
+
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if where:
+        sql += f" WHERE {' AND '.join(where)}"
+    if dimensions:
+        positions = ', '.join(str(i + 1) for i in range(len(dimensions)))
+        sql += f" GROUP BY {positions}"
+        sql += f" ORDER BY {order_by + ' DESC' if order_by else positions}"
+    return sql, params
+
+
+class CampaignQuery:
+    """Slices campaign data on a reused executor, so repeated calls skip connection setup
+
+        >>> q = CampaignQuery()
+        >>> q.slice(start='2024-10-01', end='2024-12-31', channel='Google Ads',
+        ...         product='Premium Plan', dimensions=['month'], metrics=['roas', 'cac'])
+    """
+
+    def __init__(self, db_path=DB_PATH, executor=None):
+        self.own_executor = executor is None
+        self.executor = executor or QueryExecutor(db_path, max_workers=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def slice(self, **kwargs):
+        """DataFrame for a slice; takes the same arguments as compile_query"""
+
+        sql, params = compile_query(**kwargs)
+        return self.executor.query(sql, params)
+
+    def explain(self, **kwargs):
+        """SQLite's plan for a slice, to check which table and index it uses"""
+
+        sql, params = compile_query(**kwargs)
+        plan = self.executor.connection().execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return '\n'.join(row[-1] for row in plan)
+
+    def close(self):
+        if self.own_executor:
+            self.executor.close()
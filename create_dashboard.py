@@ -3,27 +3,112 @@ Dashboard Visualization Script
 Creates interactive charts using Plotly
 """
 
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 import pandas as pd
+import plotly
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
+from approximate import estimate, load_sample
+from budget_simulator import DEFAULT_SCENARIOS, simulate_allocations
+from campaign_data import load_campaigns
+from instrumentation import TRACE_PATH, configure, traced
+from metrics import MEASURES, total
+
+
+# Cube layout: every chart is a roll-up of these cells
+CUBE_DIMENSIONS = ['month', 'channel', 'campaign_type', 'product']
+CUBE_MEASURES = MEASURES
+
+DASHBOARD_DIR = 'dashboards'
+
+# Where the combined page gets plotly.js from: embedded once, a shared
+# plotly.min.js next to the page, or the plotly CDN
+PLOTLYJS_MODES = ['inline', 'directory', 'cdn']
+
+# Daily traces switch from SVG to WebGL above this many plotted points in total
+SCATTERGL_THRESHOLD = 10_000
+
+# Points kept per daily trace, about one per horizontal pixel of the chart
+POINT_BUDGET = 1000
+
+# Only the columns the cube needs are read
+DASHBOARD_COLUMNS = ['date'] + CUBE_DIMENSIONS[1:] + CUBE_MEASURES
+
 
+@traced()
 def load_data():
     """Load marketing campaign data"""
-    return pd.read_csv('data/marketing_campaigns.csv')
+    return load_campaigns(DASHBOARD_COLUMNS)
+
+
+def month_labels(dates):
+    """'YYYY-MM' label for each date, parsing each distinct date only once"""
+
+    codes, uniques = pd.factorize(dates)
+    months = pd.to_datetime(np.asarray(uniques)).strftime('%Y-%m')
+    labels, inverse = np.unique(np.asarray(months), return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes], labels)
+
+
+@traced()
+def build_cube(df):
+    """Aggregate raw rows into a month × channel × campaign_type × product cube in one pass"""
+
+    keys = [month_labels(df['date']), df['channel'], df['campaign_type'], df['product']]
+    cube = df[CUBE_MEASURES].groupby(keys, observed=True).sum()
+    cube.index.names = CUBE_DIMENSIONS
+    cube = cube.reset_index()
+    cube.attrs['cube'] = True
+    return cube
+
+
+def as_cube(data):
+    """Accept either a cube from build_cube or raw rows"""
+    return data if data.attrs.get('cube') else build_cube(data)
+
 
+def cube_slice(cube, dimensions):
+    """Roll the cube up to the given dimensions; no dimensions gives the grand totals
 
-def create_channel_performance_chart(df):
+    A stratified sample from approximate.load_sample rolls up to estimates,
+    with _low/_high confidence bounds next to each measure and ROAS.
+    """
+
+    if cube.attrs.get('sample'):
+        return estimate(cube, dimensions)
+    if not dimensions:
+        return pd.DataFrame({measure: [cube[measure].sum()] for measure in CUBE_MEASURES})
+    return cube.groupby(dimensions, observed=True)[CUBE_MEASURES].sum().reset_index()
+
+
+def error_bars(frame, column):
+    """Plotly error bar settings from a column's _low/_high bounds, when it has them"""
+
+    if f"{column}_low" not in frame:
+        return None
+    return dict(type='data', array=frame[f"{column}_high"] - frame[column],
+                arrayminus=frame[column] - frame[f"{column}_low"])
+
+
+def approximate_title(title, cube):
+    """Chart title, marked as an estimate when drawn from a sample"""
+    return f"{title} (≈ estimate, 95% CI)" if cube.attrs.get('sample') else title
+
+
+@traced()
+def create_channel_performance_chart(cube, save=True, include_plotlyjs=True):
     """Bar chart of ROAS by channel"""
 
-    channel_perf = df.groupby('channel').agg({
-        'spend': 'sum',
-        'revenue': 'sum',
-        'conversions': 'sum'
-    }).reset_index()
+    channel_perf = cube_slice(as_cube(cube), ['channel'])
 
-    channel_perf['roas'] = (channel_perf['revenue'] / channel_perf['spend']).round(2)
+    channel_perf['roas'] = total('roas', channel_perf).round(2)
     channel_perf = channel_perf.sort_values('roas', ascending=True)
 
     # Color code by performance
@@ -36,97 +121,104 @@ def create_channel_performance_chart(df):
             x=channel_perf['roas'],
             orientation='h',
             marker=dict(color=colors),
+            error_x=error_bars(channel_perf, 'roas'),
             text=channel_perf['roas'],
             textposition='outside'
         )
     ])
 
     fig.update_layout(
-        title='Channel Performance by ROAS',
+        title=approximate_title('Channel Performance by ROAS', cube),
         xaxis_title='Return on Ad Spend (ROAS)',
         yaxis_title='Channel',
         height=500
     )
 
-    fig.write_html('dashboards/channel_performance.html')
-    print("✅ Created: dashboards/channel_performance.html")
+    if save:
+        save_figure(fig, 'channel_performance', include_plotlyjs)
 
     return fig
 
 
-def create_monthly_trend_chart(df):
+@traced()
+def create_monthly_trend_chart(cube, save=True, include_plotlyjs=True):
     """Line chart of monthly revenue and spend"""
 
-    df['month'] = pd.to_datetime(df['date']).dt.to_period('M').astype(str)
-
-    monthly = df.groupby('month').agg({
-        'spend': 'sum',
-        'revenue': 'sum',
-        'conversions': 'sum'
-    }).reset_index()
+    monthly = cube_slice(as_cube(cube), ['month'])
+    monthly['month'] = monthly['month'].astype(str)
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     fig.add_trace(
-        go.Scatter(x=monthly['month'], y=monthly['revenue'],
+        go.Scatter(x=monthly['month'], y=monthly['revenue'], error_y=error_bars(monthly, 'revenue'),
                    name='Revenue', line=dict(color='green', width=3)),
         secondary_y=False
     )
 
     fig.add_trace(
-        go.Scatter(x=monthly['month'], y=monthly['spend'],
+        go.Scatter(x=monthly['month'], y=monthly['spend'], error_y=error_bars(monthly, 'spend'),
                    name='Spend', line=dict(color='red', width=3)),
         secondary_y=False
     )
 
     fig.update_layout(
-        title='Monthly Revenue vs Spend Trend',
+        title=approximate_title('Monthly Revenue vs Spend Trend', cube),
         height=500
     )
 
     fig.update_xaxes(title_text='Month')
     fig.update_yaxes(title_text='Amount ($)', secondary_y=False)
 
-    fig.write_html('dashboards/monthly_trends.html')
-    print("✅ Created: dashboards/monthly_trends.html")
+    if save:
+        save_figure(fig, 'monthly_trends', include_plotlyjs)
 
     return fig
 
 
-def create_conversion_funnel(df):
+@traced()
+def create_conversion_funnel(cube, save=True, include_plotlyjs=True):
     """Funnel chart showing conversion stages"""
 
-    total_impressions = df['impressions'].sum()
-    total_clicks = df['clicks'].sum()
-    total_conversions = df['conversions'].sum()
+    totals = cube_slice(as_cube(cube), [])
+    stages = ['impressions', 'clicks', 'conversions']
+
+    # Estimates carry their confidence bounds in the hover text
+    bounds = None
+    if 'impressions_low' in totals:
+        bounds = [f"95% CI: {totals.at[0, f'{stage}_low']:,.0f} – {totals.at[0, f'{stage}_high']:,.0f}"
+                  for stage in stages]
 
     fig = go.Figure(go.Funnel(
         y=['Impressions', 'Clicks', 'Conversions'],
-        x=[total_impressions, total_clicks, total_conversions],
+        x=[totals.at[0, stage] for stage in stages],
+        hovertext=bounds,
         textposition='inside',
         textinfo='value+percent initial'
     ))
 
     fig.update_layout(
-        title='Marketing Conversion Funnel',
+        title=approximate_title('Marketing Conversion Funnel', cube),
         height=500
     )
 
-    fig.write_html('dashboards/conversion_funnel.html')
-    print("✅ Created: dashboards/conversion_funnel.html")
+    if save:
+        save_figure(fig, 'conversion_funnel', include_plotlyjs)
 
     return fig
 
 
-def create_budget_allocation(df):
+@traced()
+def create_budget_allocation(cube, save=True, include_plotlyjs=True):
     """Treemap of budget allocation by channel"""
 
-    channel_spend = df.groupby('channel').agg({
-        'spend': 'sum',
-        'revenue': 'sum'
-    }).reset_index()
+    channel_spend = cube_slice(as_cube(cube), ['channel'])
+
+    channel_spend['roas'] = total('roas', channel_spend).round(2)
 
-    channel_spend['roas'] = (channel_spend['revenue'] / channel_spend['spend']).round(2)
+    # Estimates show their spend and ROAS confidence bounds on hover
+    bounds = [f"{column}_{side}" for column in ('spend', 'roas') for side in ('low', 'high')
+              if f"{column}_{side}" in channel_spend]
+    channel_spend[bounds] = channel_spend[bounds].round(2)
 
     fig = px.treemap(
         channel_spend,
@@ -134,26 +226,299 @@ def create_budget_allocation(df):
         values='spend',
         color='roas',
         color_continuous_scale='RdYlGn',
-        title='Budget Allocation by Channel (Size=Spend, Color=ROAS)'
+        hover_data=bounds or None,
+        title=approximate_title('Budget Allocation by Channel (Size=Spend, Color=ROAS)', cube)
+    )
+
+    if save:
+        save_figure(fig, 'budget_allocation', include_plotlyjs)
+
+    return fig
+
+
+@traced()
+def create_budget_simulation_chart(simulation, save=True, include_plotlyjs=True):
+    """Box plot of simulated ROAS per budget allocation, from budget_simulator output
+
+    Boxes are drawn from the precomputed percentiles (whiskers at p5/p95),
+    so the page does not carry every scenario.
+    """
+
+    fig = go.Figure(go.Box(
+        x=simulation['allocation'],
+        q1=simulation['roas_p25'],
+        median=simulation['roas_p50'],
+        q3=simulation['roas_p75'],
+        lowerfence=simulation['roas_p5'],
+        upperfence=simulation['roas_p95'],
+        mean=simulation['roas'],
+        customdata=simulation[['revenue', 'revenue_p5', 'revenue_p95', 'p_beats_current']],
+        hovertemplate='%{x}<br>Expected revenue: $%{customdata[0]:,.0f}'
+                      '<br>Revenue p5-p95: $%{customdata[1]:,.0f} - $%{customdata[2]:,.0f}'
+                      '<br>Beats current: %{customdata[3]:.0%}<extra></extra>',
+        marker_color='#2ca02c',
+        boxmean=True
+    ))
+
+    fig.update_layout(
+        title='Simulated ROAS by Budget Allocation (Monte Carlo, p5-p95 whiskers)',
+        xaxis_title='Allocation',
+        yaxis_title='ROAS',
+        height=500,
+        showlegend=False
     )
 
-    fig.write_html('dashboards/budget_allocation.html')
-    print("✅ Created: dashboards/budget_allocation.html")
+    if save:
+        save_figure(fig, 'budget_simulation', include_plotlyjs)
 
     return fig
 
 
-def main():
+@traced()
+def daily_channel_series(df):
+    """Daily revenue and spend per channel, in date order"""
+
+    daily = df.groupby(['channel', 'date'], observed=True)[['spend', 'revenue']].sum().reset_index()
+    daily['date'] = pd.to_datetime(daily['date'])
+    return daily
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the line's shape"""
+
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n) if n <= n_out else np.array([0, n - 1])
+
+    # First and last points are kept; the rest fall into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+
+        # Keep the point forming the largest triangle with the last kept point
+        # and the next bucket's average
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """Indices of the minimum and maximum in each of n_out / 2 equal buckets"""
+
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    bucket = np.arange(n) * (n_out // 2) // n
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_out // 2))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(x, y, n_out=POINT_BUDGET, method='lttb'):
+    """Reduce one series to at most n_out points"""
+
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if method == 'lttb':
+        x_numeric = x.astype('datetime64[ns]').astype(np.int64) if x.dtype.kind == 'M' else x
+        indices = lttb_indices(x_numeric.astype(float), y, n_out)
+    elif method == 'minmax':
+        indices = minmax_indices(y, n_out)
+    else:
+        raise ValueError("method must be 'lttb' or 'minmax'")
+    return x[indices], y[indices]
+
+
+@traced()
+def create_daily_trend_chart(daily, metric='revenue', point_budget=POINT_BUDGET, method='lttb',
+                             save=True, include_plotlyjs=True):
+    """Line chart of a daily metric per channel, downsampled and WebGL-rendered at scale"""
+
+    if not isinstance(daily, pd.DataFrame) or 'month' in daily:
+        raise TypeError("create_daily_trend_chart needs daily_channel_series() output")
+
+    series = [
+        (str(channel), *downsample(rows['date'], rows[metric], point_budget, method))
+        for channel, rows in daily.groupby('channel', observed=True)
+    ]
+    total_points = len(daily)
+    shown = sum(len(x) for _, x, _ in series)
+    trace_type = go.Scattergl if shown > SCATTERGL_THRESHOLD else go.Scatter
+
+    fig = go.Figure([trace_type(x=x, y=y, name=channel, mode='lines') for channel, x, y in series])
+    fig.update_layout(
+        title=f'Daily {metric.title()} by Channel ({shown:,} of {total_points:,} points)',
+        xaxis_title='Date',
+        yaxis_title='Amount ($)',
+        height=500
+    )
+
+    if save:
+        save_figure(fig, f'daily_{metric}', include_plotlyjs)
+
+    return fig
+
+
+def save_figure(fig, name, include_plotlyjs=True):
+    """Write one chart to dashboards/<name>.html"""
+
+    path = f"{DASHBOARD_DIR}/{name}.html"
+    fig.write_html(path, include_plotlyjs=include_plotlyjs)
+    print(f"✅ Created: {path}")
+
+
+# Charts in page order, keyed by their output name
+CHARTS = {
+    'channel_performance': create_channel_performance_chart,
+    'monthly_trends': create_monthly_trend_chart,
+    'conversion_funnel': create_conversion_funnel,
+    'budget_allocation': create_budget_allocation,
+}
+
+
+def render_chart_json(name, cube):
+    """Build one chart without saving it and serialize it to JSON"""
+    return CHARTS[name](cube, save=False).to_json()
+
+
+def render_charts_json(cube, names=None, workers=None):
+    """Figure JSON for each chart, built and serialized in a process pool"""
+
+    names = list(names or CHARTS)
+    workers = min(len(names), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [render_chart_json(name, cube) for name in names]
+
+    # Workers receive the small cube rather than the raw rows
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_chart_json, names, repeat(cube)))
+
+
+@traced()
+def write_combined_dashboard(cube, path=f"{DASHBOARD_DIR}/dashboard.html", plotlyjs='directory',
+                             workers=None, daily=None, simulation=None):
+    """Write every chart into one page that loads plotly.js a single time
+
+    Pass daily_channel_series() output as daily to include the daily trend,
+    and simulate_allocations() output as simulation for the budget what-if.
+    """
+
+    if plotlyjs not in PLOTLYJS_MODES:
+        raise ValueError(f"plotlyjs must be one of {PLOTLYJS_MODES}")
+
+    names = list(CHARTS)
+    figures = render_charts_json(cube, names, workers)
+    if simulation is not None:
+        # Right after the budget treemap
+        at = names.index('budget_allocation') + 1
+        names.insert(at, 'budget_simulation')
+        figures.insert(at, create_budget_simulation_chart(simulation, save=False).to_json())
+    if daily is not None:
+        names.append('daily_revenue')
+        figures.append(create_daily_trend_chart(daily, save=False).to_json())
+
+    if plotlyjs == 'inline':
+        script = f"<script>{plotly.offline.get_plotlyjs()}</script>"
+    elif plotlyjs == 'directory':
+        js_path = os.path.join(os.path.dirname(path) or '.', 'plotly.min.js')
+        if not os.path.exists(js_path):
+            with open(js_path, 'w', encoding='utf-8') as f:
+                f.write(plotly.offline.get_plotlyjs())
+        script = '<script src="plotly.min.js"></script>'
+    else:
+        version = plotly.offline.get_plotlyjs_version()
+        script = f'<script src="https://cdn.plot.ly/plotly-{version}.min.js"></script>'
+
+    divs = '\n'.join(f'<div id="{name}"></div>' for name in names)
+    # '<\/' keeps any '</script>' inside figure text from closing the tag
+    figures = [figure.replace('</', '<\\/') for figure in figures]
+    plots = '\n'.join(f"show('{name}', {figure});" for name, figure in zip(names, figures))
+
+    page = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Marketing Campaign Dashboard</title>
+{script}
+</head>
+<body>
+{divs}
+<script>
+function show(id, fig) {{ Plotly.newPlot(id, fig.data, fig.layout, {{responsive: true}}); }}
+{plots}
+</script>
+</body>
+</html>
+"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+
+    print(f"✅ Created: {path} ({len(page.encode()) / 1024:,.0f} KB, plotly.js: {plotlyjs})")
+    return path
+
+
+def main(argv=None):
     """Generate all dashboard visualizations"""
 
-    print("📊 Loading data...")
-    df = load_data()
+    parser = argparse.ArgumentParser(description="Create the dashboard charts")
+    parser.add_argument('--combined', action='store_true',
+                        help="write one dashboard.html holding every chart")
+    parser.add_argument('--plotlyjs', choices=PLOTLYJS_MODES,
+                        help="how pages get plotly.js (default: inline for separate files, "
+                             "directory for the combined page)")
+    parser.add_argument('--workers', type=int, help="processes for rendering the combined page")
+    parser.add_argument('--approximate', action='store_true',
+                        help="estimate the charts from the database's stratified sample, with "
+                             "95%% error bars (skips the daily chart)")
+    parser.add_argument('--scenarios', type=int, nargs='?', const=DEFAULT_SCENARIOS, default=0,
+                        help="add the Monte Carlo budget what-if chart, over this many scenarios "
+                             f"(default when given: {DEFAULT_SCENARIOS:,})")
+    parser.add_argument('--trace', nargs='?', const=TRACE_PATH,
+                        help=f"record stage timings as JSON lines (default: {TRACE_PATH})")
+    parser.add_argument('--profile-dir', help="also write a cProfile .prof file per stage here")
+    args = parser.parse_args(argv)
+    configure(args.trace, args.profile_dir)
+
+    if args.approximate:
+        print("🎲 Loading stratified sample...")
+        cube, daily = load_sample(), None
+    else:
+        print("📊 Loading data...")
+        df = load_data()
+
+        print("🧊 Aggregating data cube...")
+        cube = build_cube(df)
+        daily = daily_channel_series(df)
+
+    simulation = None
+    if args.scenarios > 0:
+        print(f"🎲 Simulating {args.scenarios:,} budget scenarios...")
+        channel_spend = cube_slice(cube, ['channel']).set_index('channel')['spend']
+        simulation = simulate_allocations(channel_spend, n_scenarios=args.scenarios)
 
     print("\n🎨 Creating visualizations...")
-    create_channel_performance_chart(df)
-    create_monthly_trend_chart(df)
-    create_conversion_funnel(df)
-    create_budget_allocation(df)
+    if args.combined:
+        write_combined_dashboard(cube, plotlyjs=args.plotlyjs or 'directory', workers=args.workers,
+                                 daily=daily, simulation=simulation)
+    else:
+        include_plotlyjs = {None: True, 'inline': True}.get(args.plotlyjs, args.plotlyjs)
+        for name, create_chart in CHARTS.items():
+            create_chart(cube, include_plotlyjs=include_plotlyjs)
+            if name == 'budget_allocation' and simulation is not None:
+                create_budget_simulation_chart(simulation, include_plotlyjs=include_plotlyjs)
+        if daily is not None:
+            create_daily_trend_chart(daily, include_plotlyjs=include_plotlyjs)
 
     print("\n" + "=" * 70)
     print("✅ ALL DASHBOARDS CREATED!")
@@ -0,0 +1,306 @@
+"""
+Dashboard Server
+Serves the dashboard charts over HTTP from in-memory aggregates
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import plotly
+
+from campaign_data import CSV_PATH, csv_signature
+from create_dashboard import CHARTS, CUBE_DIMENSIONS, CUBE_MEASURES
+from sql_analysis import DB_PATH, refresh_database
+
+# Seconds between checks of the CSV and database for new data
+CHECK_INTERVAL = 1.0
+
+# Rendered figures kept per (chart, filters)
+FIGURE_CACHE_SIZE = 256
+
+CUBE_QUERY = f"""
+    SELECT month, channel, campaign_type, product,
+           {', '.join(f'SUM({m}) as {m}' for m in CUBE_MEASURES)}
+    FROM rollup_monthly_segment
+    {{where}}
+    GROUP BY month, channel, campaign_type, product
+"""
+
+
+class DashboardState:
+    """Month-partitioned cube kept in memory, plus a cache of rendered figures
+
+    The cube is read from the monthly segment rollup. When the CSV grows, it
+    is ingested incrementally and only the months listed in ingest_months
+    for the new batches are re-read; a full reload re-reads everything.
+    """
+
+    def __init__(self, csv_path=CSV_PATH, db_path=DB_PATH):
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.partitions = {}
+        self.cube = None
+        self.version = 0
+        self.batch_id = 0
+        self.db_inode = None
+        self.csv_signature = csv_signature(csv_path)
+        self.checked_at = 0.0
+        self.figures = OrderedDict()
+
+        # Brings the database up to date with the CSV, building it if missing
+        refresh_database(csv_path, db_path)
+        self.sync()
+
+    def connect(self):
+        """Read-only connection to the analysis database"""
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def sync(self):
+        """Pick up ingest batches newer than the last one seen"""
+
+        # A full rebuild swaps in a new database file with its own batch ids
+        inode = os.stat(self.db_path).st_ino
+        if inode != self.db_inode:
+            self.db_inode, self.batch_id, self.cube = inode, 0, None
+
+        conn = self.connect()
+        try:
+            batches = conn.execute(
+                "SELECT batch_id, mode FROM ingest_log WHERE batch_id > ? ORDER BY batch_id",
+                (self.batch_id,)
+            ).fetchall()
+            if not batches:
+                return
+
+            if self.cube is None or any(mode == 'full' for _, mode in batches):
+                self.partitions = self.read_months(conn, None)
+            else:
+                months = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT month FROM ingest_months WHERE batch_id > ?", (self.batch_id,)
+                )]
+                self.partitions.update(self.read_months(conn, months))
+        finally:
+            conn.close()
+
+        self.batch_id = batches[-1][0]
+        cube = pd.concat(self.partitions.values(), ignore_index=True) if self.partitions else None
+        if cube is not None:
+            cube.attrs['cube'] = True
+        self.cube = cube
+        self.version += 1
+        self.figures.clear()
+
+    def read_months(self, conn, months):
+        """Cube cells for the given months (all months when None), split by month"""
+
+        if months is None:
+            cells = pd.read_sql_query(CUBE_QUERY.format(where=''), conn)
+        else:
+            placeholders = ', '.join('?' for _ in months)
+            cells = pd.read_sql_query(
+                CUBE_QUERY.format(where=f"WHERE month IN ({placeholders})"), conn, params=months
+            )
+        return {month: part.reset_index(drop=True) for month, part in cells.groupby('month')}
+
+    def refresh(self):
+        """Ingest CSV changes and re-read affected months, at most once per interval"""
+
+        now = time.monotonic()
+        if now - self.checked_at < CHECK_INTERVAL:
+            return
+        self.checked_at = now
+
+        signature = csv_signature(self.csv_path)
+        if signature != self.csv_signature:
+            refresh_database(self.csv_path, self.db_path)
+            self.csv_signature = signature
+        self.sync()
+
+    def figure(self, name, start=None, end=None, channels=()):
+        """(etag, figure JSON) for a chart over the filtered cube"""
+
+        key = (name, start, end, tuple(sorted(channels)))
+        with self.lock:
+            self.refresh()
+            cached = self.figures.get(key)
+            if cached is not None:
+                self.figures.move_to_end(key)
+                return cached
+            cube, version = self.cube, self.version
+
+        body = CHARTS[name](filter_cube(cube, start, end, channels), save=False).to_json()
+        # Hashed from the body, so a restarted server never reuses an ETag for other data
+        etag = '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+        with self.lock:
+            if version == self.version:
+                self.figures[key] = (etag, body)
+                while len(self.figures) > FIGURE_CACHE_SIZE:
+                    self.figures.popitem(last=False)
+        return etag, body
+
+    def options(self):
+        """Months and channels available for the filter controls"""
+
+        with self.lock:
+            self.refresh()
+            cube = self.cube
+        return {
+            'months': sorted(cube['month'].unique().tolist()),
+            'channels': sorted(cube['channel'].unique().tolist()),
+        }
+
+
+def filter_cube(cube, start=None, end=None, channels=()):
+    """Cube cells within [start, end] months and the given channels
+
+    Dates are matched at month granularity: '2025-03-15' selects March 2025.
+    """
+
+    mask = pd.Series(True, index=cube.index)
+    if start:
+        mask &= cube['month'] >= start[:7]
+    if end:
+        mask &= cube['month'] <= end[:7]
+    if channels:
+        mask &= cube['channel'].isin(channels)
+
+    subset = cube.loc[mask, CUBE_DIMENSIONS + CUBE_MEASURES].reset_index(drop=True)
+    subset.attrs['cube'] = True
+    return subset
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Marketing Campaign Dashboard</title>
+<script src="/plotly.min.js"></script>
+</head>
+<body>
+<form id="filters">
+  From <select name="start"></select>
+  to <select name="end"></select>
+  <select name="channel" multiple size="4"></select>
+  <button type="submit">Apply</button>
+</form>
+%(divs)s
+<script>
+const charts = %(charts)s;
+const form = document.getElementById('filters');
+
+function fill(select, values, selected) {
+  select.innerHTML = values.map(v => `<option${v === selected ? ' selected' : ''}>${v}</option>`).join('');
+}
+
+async function draw() {
+  const query = new URLSearchParams(new FormData(form)).toString();
+  history.replaceState(null, '', '?' + query);
+  await Promise.all(charts.map(async name => {
+    const fig = await (await fetch(`/api/figures/${name}?${query}`)).json();
+    Plotly.react(name, fig.data, fig.layout, {responsive: true});
+  }));
+}
+
+fetch('/api/options').then(r => r.json()).then(options => {
+  fill(form.start, options.months, options.months[0]);
+  fill(form.end, options.months, options.months[options.months.length - 1]);
+  fill(form.channel, options.channels);
+  form.addEventListener('submit', e => { e.preventDefault(); draw(); });
+  draw();
+});
+</script>
+</body>
+</html>
+"""
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    """Routes: / (page), /plotly.min.js, /api/options, /api/figures/<chart>"""
+
+    state = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/':
+            divs = '\n'.join(f'<div id="{name}"></div>' for name in CHARTS)
+            page = PAGE % {'divs': divs, 'charts': json.dumps(list(CHARTS))}
+            self.send_body(page.encode(), 'text/html; charset=utf-8')
+        elif url.path == '/plotly.min.js':
+            self.send_body(PLOTLYJS, 'application/javascript', etag=PLOTLYJS_ETAG,
+                           cache_control='public, max-age=86400')
+        elif url.path == '/api/options':
+            self.send_body(json.dumps(self.state.options()).encode(), 'application/json')
+        elif url.path.startswith('/api/figures/') and url.path.split('/')[-1] in CHARTS:
+            etag, body = self.state.figure(
+                url.path.split('/')[-1],
+                start=query.get('start', [None])[0],
+                end=query.get('end', [None])[0],
+                channels=query.get('channel', [])
+            )
+            self.send_body(body.encode(), 'application/json', etag=etag)
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+
+    def send_body(self, body, content_type, etag=None, cache_control='no-cache'):
+        """Send a response, or 304 when the client already has this ETag"""
+
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', cache_control)
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"   {self.address_string()} {format % args}")
+
+
+PLOTLYJS = plotly.offline.get_plotlyjs().encode()
+PLOTLYJS_ETAG = f'"{plotly.offline.get_plotlyjs_version()}"'
+
+
+def main(argv=None):
+    """Serve the dashboard until interrupted"""
+
+    parser = argparse.ArgumentParser(description="Serve the marketing dashboard locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args(argv)
+
+    print("📊 Loading aggregates...")
+    DashboardHandler.state = DashboardState()
+
+    server = ThreadingHTTPServer((args.host, args.port), DashboardHandler)
+    print(f"🌐 Dashboard at http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,128 +1,437 @@
-
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
+from campaign_data import write_column_cache
+from instrumentation import TRACE_PATH, add_rows, configure, traced
+from metrics import add_derived_columns
+
+# Default seed for reproducible datasets
+DEFAULT_SEED = 42
+
+OUTPUT_PATH = 'data/marketing_campaigns.csv'
+
+# Default date range: July 2024 - October 2025 (16 months)
+DEFAULT_START = '2024-07-01'
+DEFAULT_END = '2025-10-31'
+
+# Marketing channels
+CHANNELS = [
+    'Google Ads', 'Facebook Ads', 'Instagram Ads', 'LinkedIn Ads',
+    'Email Marketing', 'Organic Search', 'Display Ads', 'YouTube Ads',
+    'Twitter Ads', 'TikTok Ads', 'Affiliate Marketing', 'Referral'
+]
+
+# Campaign types
+CAMPAIGN_TYPES = [
+    'Brand Awareness', 'Lead Generation', 'Product Launch',
+    'Retargeting', 'Seasonal Promotion', 'Flash Sale'
+]
+
+# Products
+PRODUCTS = [
+    'Premium Plan', 'Basic Plan', 'Enterprise Plan',
+    'Starter Kit', 'Add-on Service'
+]
+
+# Realistic performance characteristics for each channel, as (low, high) ranges.
+# Impressions are drawn as integers in [low, high), everything else uniformly.
+CHANNEL_PROFILES = {
+    'Google Ads': {
+        'impressions': (8000, 15000),
+        'ctr': (0.03, 0.05),
+        'conv_rate': (0.08, 0.12),
+        'spend': (800, 1500),
+        'avg_order_value': (120, 180)
+    },
+    'Facebook Ads': {
+        'impressions': (12000, 20000),
+        'ctr': (0.02, 0.04),
+        'conv_rate': (0.05, 0.09),
+        'spend': (600, 1200),
+        'avg_order_value': (90, 140)
+    },
+    'Instagram Ads': {
+        'impressions': (10000, 18000),
+        'ctr': (0.025, 0.045),
+        'conv_rate': (0.04, 0.08),
+        'spend': (500, 1000),
+        'avg_order_value': (80, 120)
+    },
+    'LinkedIn Ads': {
+        'impressions': (3000, 6000),
+        'ctr': (0.015, 0.03),
+        'conv_rate': (0.10, 0.15),
+        'spend': (900, 1800),
+        'avg_order_value': (200, 350)
+    },
+    'Email Marketing': {
+        'impressions': (15000, 25000),
+        'ctr': (0.15, 0.25),
+        'conv_rate': (0.08, 0.14),
+        'spend': (100, 300),
+        'avg_order_value': (110, 160)
+    },
+    'Organic Search': {
+        'impressions': (20000, 35000),
+        'ctr': (0.04, 0.08),
+        'conv_rate': (0.10, 0.16),
+        'spend': (0, 0),  # Organic = no ad spend
+        'avg_order_value': (100, 150)
+    },
+    'Display Ads': {
+        'impressions': (25000, 40000),
+        'ctr': (0.01, 0.02),
+        'conv_rate': (0.02, 0.05),
+        'spend': (700, 1300),
+        'avg_order_value': (85, 130)
+    },
+    'YouTube Ads': {
+        'impressions': (15000, 25000),
+        'ctr': (0.015, 0.03),
+        'conv_rate': (0.04, 0.08),
+        'spend': (800, 1400),
+        'avg_order_value': (95, 145)
+    },
+    'Twitter Ads': {
+        'impressions': (8000, 14000),
+        'ctr': (0.02, 0.035),
+        'conv_rate': (0.03, 0.06),
+        'spend': (400, 800),
+        'avg_order_value': (75, 115)
+    },
+    'TikTok Ads': {
+        'impressions': (18000, 30000),
+        'ctr': (0.025, 0.045),
+        'conv_rate': (0.03, 0.07),
+        'spend': (600, 1100),
+        'avg_order_value': (70, 110)
+    },
+    'Affiliate Marketing': {
+        'impressions': (5000, 10000),
+        'ctr': (0.04, 0.07),
+        'conv_rate': (0.08, 0.13),
+        'spend': (300, 700),
+        'avg_order_value': (100, 150)
+    },
+    'Referral': {
+        'impressions': (3000, 7000),
+        'ctr': (0.05, 0.10),
+        'conv_rate': (0.12, 0.18),
+        'spend': (50, 200),
+        'avg_order_value': (120, 180)
+    }
+}
+
+# Seasonal multipliers indexed by month (index 0 unused)
+SEASONAL_MULTIPLIERS = np.array([
+    1.0,
+    1.2, 1.2,  # New Year
+    1.0, 1.0, 1.0,
+    0.85, 0.85, 0.85,  # Summer
+    1.0, 1.0,
+    1.4, 1.4  # Holiday season
+])
+
+# Weekend effect (lower engagement), indexed by weekday (Monday = 0)
+WEEKDAY_MULTIPLIERS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.7, 0.7])
+
+# Base measures summed for the channel summary
+SUMMARY_MEASURES = ['spend', 'revenue', 'conversions', 'impressions', 'clicks']
+
+
+def channel_roster(n_channels=len(CHANNELS)):
+    """Channel names for a dataset with n_channels channels
+
+    Beyond the 12 real channels, extra synthetic channels reuse the base
+    profiles in order and get a numeric suffix, e.g. 'Google Ads 2'.
+    """
+
+    if n_channels < 1:
+        raise ValueError("n_channels must be at least 1")
+
+    roster = []
+    for i in range(n_channels):
+        base = CHANNELS[i % len(CHANNELS)]
+        copy = i // len(CHANNELS)
+        roster.append(base if copy == 0 else f"{base} {copy + 1}")
+    return roster
+
+
+def base_channel(channel):
+    """Profile name behind a (possibly synthetic) channel name"""
+
+    if channel in CHANNEL_PROFILES:
+        return channel
+    base, _, suffix = channel.rpartition(' ')
+    if base in CHANNEL_PROFILES and suffix.isdigit():
+        return base
+    raise KeyError(f"Unknown channel: {channel}")
+
+
+def profile_arrays(channels):
+    """Stack the (low, high) profile ranges of each channel into arrays"""
+
+    profiles = [CHANNEL_PROFILES[base_channel(c)] for c in channels]
+    return {
+        param: (
+            np.array([p[param][0] for p in profiles], dtype=float),
+            np.array([p[param][1] for p in profiles], dtype=float)
+        )
+        for param in CHANNEL_PROFILES['Google Ads']
+    }
+
+
+def generate_batch(dates, channels, rows_per_day=1, rng=None, compact=False):
+    """Generate one row per date × channel × slot, drawing every column as a whole array
 
+    With compact, only the base measures are kept; the derived columns can
+    be recomputed from them (see metrics.py).
+    """
 
-def generate_marketing_data():
-    """Generate 16 months of marketing campaign data"""
+    if rng is None:
+        rng = np.random.default_rng(DEFAULT_SEED)
+
+    dates = pd.DatetimeIndex(dates)
+    n_dates = len(dates)
+    n_channels = len(channels)
+    n_rows = n_dates * n_channels * rows_per_day
+
+    # Row order matches the original loop: date, then channel, then slot
+    date_idx = np.repeat(np.arange(n_dates), n_channels * rows_per_day)
+    channel_idx = np.tile(np.repeat(np.arange(n_channels), rows_per_day), n_dates)
+
+    profiles = profile_arrays(channels)
+
+    def draw(param):
+        low, high = profiles[param]
+        return rng.uniform(low[channel_idx], high[channel_idx])
+
+    # Channel-specific performance
+    imp_low, imp_high = profiles['impressions']
+    base_impressions = rng.integers(
+        imp_low.astype(np.int64)[channel_idx], imp_high.astype(np.int64)[channel_idx]
+    )
+    base_clicks = (base_impressions * draw('ctr')).astype(np.int64)
+    base_conversions = (base_clicks * draw('conv_rate')).astype(np.int64)
+    base_spend = draw('spend')
+    avg_order_value = draw('avg_order_value')
+
+    # Seasonal and weekend multipliers per date, broadcast to rows
+    date_mult = SEASONAL_MULTIPLIERS[dates.month] * WEEKDAY_MULTIPLIERS[dates.weekday]
+    mult = date_mult[date_idx]
+
+    impressions = (base_impressions * mult).astype(np.int64)
+    clicks = (base_clicks * mult).astype(np.int64)
+    conversions = (base_conversions * mult).astype(np.int64)
+    spend = base_spend * mult
+
+    # Calculate revenue
+    revenue = conversions * avg_order_value * rng.uniform(0.9, 1.1, n_rows)
+
+    # Random campaign type and product
+    campaign_type = rng.integers(0, len(CAMPAIGN_TYPES), n_rows)
+    product = rng.integers(0, len(PRODUCTS), n_rows)
+
+    df = pd.DataFrame({
+        'date': pd.Categorical.from_codes(date_idx, dates.strftime('%Y-%m-%d'), ordered=True),
+        'channel': pd.Categorical.from_codes(channel_idx, channels),
+        'campaign_type': pd.Categorical.from_codes(campaign_type, CAMPAIGN_TYPES),
+        'product': pd.Categorical.from_codes(product, PRODUCTS),
+        'impressions': impressions,
+        'clicks': clicks,
+        'conversions': conversions,
+        'spend': spend.round(2),
+        'revenue': revenue.round(2)
+    })
+
+    return df if compact else add_derived_columns(df)
+
+
+@traced()
+def generate_marketing_data(start_date=DEFAULT_START, end_date=DEFAULT_END,
+                            n_channels=len(CHANNELS), rows_per_day=1,
+                            seed=DEFAULT_SEED, output_path=OUTPUT_PATH, compact=False):
+    """Generate daily marketing campaign data (16 months by default)
+
+    With compact, the CSV holds only the base measures, not the derived columns.
+    """
 
     print("🚀 Starting data generation...")
 
-    # Date range: July 2024 - October 2025 (16 months)
-    start_date = datetime(2024, 7, 1)
-    end_date = datetime(2025, 10, 31)
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
+    channels = channel_roster(n_channels)
+    rng = np.random.default_rng(seed)
 
-    # Marketing channels
-    channels = [
-        'Google Ads', 'Facebook Ads', 'Instagram Ads', 'LinkedIn Ads',
-        'Email Marketing', 'Organic Search', 'Display Ads', 'YouTube Ads',
-        'Twitter Ads', 'TikTok Ads', 'Affiliate Marketing', 'Referral'
-    ]
+    df = generate_batch(date_range, channels, rows_per_day, rng, compact)
+    add_rows(len(df))
+    print(f"\n📊 Created DataFrame with {len(df):,} rows")
+
+    # Save to CSV, plus the columnar cache the later stages read from
+    df.to_csv(output_path, index=False)
+    write_column_cache(df, output_path)
+
+    print_summary(channel_partial_sums(df), len(df), df['date'].min(), df['date'].max(), output_path)
+
+    return df
 
-    # Campaign types
-    campaign_types = [
-        'Brand Awareness', 'Lead Generation', 'Product Launch',
-        'Retargeting', 'Seasonal Promotion', 'Flash Sale'
-    ]
 
-    # Products
-    products = [
-        'Premium Plan', 'Basic Plan', 'Enterprise Plan',
-        'Starter Kit', 'Add-on Service'
+@traced()
+def stream_marketing_data(start_date=DEFAULT_START, end_date=DEFAULT_END,
+                          n_channels=len(CHANNELS), rows_per_day=1,
+                          seed=DEFAULT_SEED, output_path=OUTPUT_PATH,
+                          parquet_path=None, chunk_freq='MS', workers=1, compact=False):
+    """Generate and write campaign data shard by shard with bounded memory
+
+    The date range is split into shards at chunk_freq boundaries (a month by
+    default). Each shard draws from its own RNG stream spawned from the seed,
+    so the output depends only on the seed and shard layout, never on the
+    number of workers. Shards are generated in a process pool when
+    workers > 1 and merged back in order; only a bounded window of shards
+    is held in memory, and the channel summary is merged from per-shard
+    partial sums. With compact, only the base measures are written.
+    """
+
+    print(f"🚀 Starting streaming data generation ({workers} worker(s))...")
+
+    channels = channel_roster(n_channels)
+    shards = date_chunks(start_date, end_date, chunk_freq)
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    specs = [
+        (dates, channels, rows_per_day, shard_seed, parquet_path is not None, compact)
+        for dates, shard_seed in zip(shards, seeds)
     ]
 
-    # Initialize data list
-    data = []
+    parquet_writer = None
+    totals = None
     total_rows = 0
+    first_date = last_date = None
+
+    with open(output_path, 'w', newline='') as csv_file:
+        try:
+            if workers > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                results = ordered_map(executor, generate_shard, specs, window=2 * workers)
+            else:
+                executor = None
+                results = map(generate_shard, specs)
+
+            for dates, shard in zip(shards, results):
+                if total_rows == 0:
+                    csv_file.write(','.join(shard['columns']) + '\n')
+                csv_file.write(shard['csv'])
+                if parquet_path:
+                    parquet_writer = write_parquet_chunk(parquet_writer, parquet_path, shard['frame'])
+
+                totals = merge_partial_sums(totals, shard['sums'])
+                total_rows += shard['rows']
+                add_rows(shard['rows'])
+                first_date = first_date or dates[0].strftime('%Y-%m-%d')
+                last_date = dates[-1].strftime('%Y-%m-%d')
+
+                print(f"   Generated {total_rows:,} rows (through {last_date})...")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if parquet_writer is not None:
+                parquet_writer.close()
+
+    print_summary(totals, total_rows, first_date, last_date, output_path)
+    if parquet_path:
+        print(f"📁 Parquet copy: {parquet_path}")
+
+    return totals
+
+
+@traced()
+def generate_shard(spec):
+    """Generate one shard from its own seed and render it as headerless CSV"""
+
+    dates, channels, rows_per_day, shard_seed, keep_frame, compact = spec
+    chunk = generate_batch(dates, channels, rows_per_day, np.random.default_rng(shard_seed), compact)
+    add_rows(len(chunk))
+
+    return {
+        'columns': list(chunk.columns),
+        'csv': chunk.to_csv(header=False, index=False),
+        'sums': channel_partial_sums(chunk),
+        'rows': len(chunk),
+        'frame': chunk if keep_frame else None
+    }
+
+
+def ordered_map(executor, fn, items, window):
+    """Like executor.map, but with at most `window` results in flight"""
+
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def date_chunks(start_date, end_date, freq='MS'):
+    """Split the daily date range into consecutive chunks at freq boundaries"""
+
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    if len(dates) == 0:
+        return []
+
+    bounds = dates.searchsorted(pd.date_range(dates[0], dates[-1], freq=freq))
+    cuts = [0] + [int(b) for b in bounds if b > 0] + [len(dates)]
+    return [dates[a:b] for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def write_parquet_chunk(writer, parquet_path, chunk):
+    """Append a chunk to a Parquet file, opening the writer on first use"""
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+
+    # Plain strings keep the schema identical across chunks
+    table = pa.Table.from_pandas(
+        chunk.astype({'date': str, 'channel': str, 'campaign_type': str, 'product': str}),
+        preserve_index=False
+    )
+    if writer is None:
+        writer = pq.ParquetWriter(parquet_path, table.schema)
+    writer.write_table(table.cast(writer.schema))
+    return writer
 
-    # Generate daily campaign data for each channel
-    for date in date_range:
-        month = date.month
-        day_of_week = date.weekday()
-
-        # Seasonal multipliers
-        if month in [11, 12]:  # Holiday season
-            seasonal_mult = 1.4
-        elif month in [6, 7, 8]:  # Summer
-            seasonal_mult = 0.85
-        elif month in [1, 2]:  # New Year
-            seasonal_mult = 1.2
-        else:
-            seasonal_mult = 1.0
-
-        # Weekend effect (lower engagement)
-        weekend_mult = 0.7 if day_of_week >= 5 else 1.0
-
-        for channel in channels:
-            # Channel-specific performance
-            performance = get_channel_performance(channel)
-
-            # Apply seasonal and weekend multipliers
-            impressions = int(performance['impressions'] * seasonal_mult * weekend_mult)
-            clicks = int(performance['clicks'] * seasonal_mult * weekend_mult)
-            conversions = int(performance['conversions'] * seasonal_mult * weekend_mult)
-            spend = performance['spend'] * seasonal_mult * weekend_mult
-            avg_order_value = performance['avg_order_value']
-
-            # Calculate revenue
-            revenue = conversions * avg_order_value * np.random.uniform(0.9, 1.1)
-
-            # Random campaign type and product
-            campaign_type = random.choice(campaign_types)
-            product = random.choice(products)
-
-            # Append row
-            data.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'channel': channel,
-                'campaign_type': campaign_type,
-                'product': product,
-                'impressions': impressions,
-                'clicks': clicks,
-                'conversions': conversions,
-                'spend': round(spend, 2),
-                'revenue': round(revenue, 2)
-            })
-            total_rows += 1
-
-        # Progress indicator
-        if total_rows % 1000 == 0:
-            print(f"   Generated {total_rows:,} rows...")
-
-    # Create DataFrame
-    print(f"\n📊 Creating DataFrame with {total_rows:,} rows...")
-    df = pd.DataFrame(data)
-
-    # Calculate metrics
-    print("🔢 Calculating marketing metrics...")
-    df['ctr'] = (df['clicks'] / df['impressions'] * 100).round(2)
-    df['conversion_rate'] = (df['conversions'] / df['clicks'] * 100).round(2)
-    df['cac'] = (df['spend'] / df['conversions']).round(2)
-    df['roas'] = (df['revenue'] / df['spend']).round(2)
-    df['profit'] = (df['revenue'] - df['spend']).round(2)
-
-    # Replace infinities and NaN
-    df = df.replace([np.inf, -np.inf], 0)
-    df = df.fillna(0)
-
-    # Save to CSV
-    output_path = 'data/marketing_campaigns.csv'
-    df.to_csv(output_path, index=False)
 
-    # Print summary
-    print(f"\n✅ SUCCESS! Generated {len(df):,} rows")
-    print(f"📅 Date range: {df['date'].min()} to {df['date'].max()}")
-    print(f"💰 Total spend: ${df['spend'].sum():,.2f}")
-    print(f"💵 Total revenue: ${df['revenue'].sum():,.2f}")
-    print(f"📈 Overall ROAS: {(df['revenue'].sum() / df['spend'].sum()):.2f}x")
+def channel_partial_sums(df):
+    """Per-channel sums of the base measures for one frame or chunk"""
+
+    return df.groupby('channel', observed=True)[SUMMARY_MEASURES].sum()
+
+
+def merge_partial_sums(totals, partial):
+    """Fold a chunk's partial sums into the running totals"""
+
+    if totals is None:
+        return partial
+    return totals.add(partial, fill_value=0).astype(partial.dtypes)
+
+
+def print_summary(channel_totals, n_rows, first_date, last_date, output_path):
+    """Print overall totals and the channel performance summary"""
+
+    total_spend = channel_totals['spend'].sum()
+    total_revenue = channel_totals['revenue'].sum()
+
+    print(f"\n✅ SUCCESS! Generated {n_rows:,} rows")
+    print(f"📅 Date range: {first_date} to {last_date}")
+    print(f"💰 Total spend: ${total_spend:,.2f}")
+    print(f"💵 Total revenue: ${total_revenue:,.2f}")
+    print(f"📈 Overall ROAS: {(total_revenue / total_spend):.2f}x")
     print(f"📁 Saved to: {output_path}")
 
     # Generate channel summary
@@ -130,13 +439,7 @@ def generate_marketing_data():
     print("📊 CHANNEL PERFORMANCE SUMMARY")
     print("=" * 60)
 
-    channel_summary = df.groupby('channel').agg({
-        'spend': 'sum',
-        'revenue': 'sum',
-        'conversions': 'sum',
-        'impressions': 'sum',
-        'clicks': 'sum'
-    }).round(2)
+    channel_summary = channel_totals.round(2)
 
     channel_summary['roas'] = (channel_summary['revenue'] / channel_summary['spend']).round(2)
     channel_summary['cac'] = (channel_summary['spend'] / channel_summary['conversions']).round(2)
@@ -146,115 +449,53 @@ def generate_marketing_data():
 
     print(channel_summary.sort_values('roas', ascending=False).to_string())
 
-    return df
 
-
-def get_channel_performance(channel):
-    """Define realistic performance characteristics for each channel"""
-
-    profiles = {
-        'Google Ads': {
-            'impressions': np.random.randint(8000, 15000),
-            'ctr': np.random.uniform(0.03, 0.05),
-            'conv_rate': np.random.uniform(0.08, 0.12),
-            'spend': np.random.uniform(800, 1500),
-            'avg_order_value': np.random.uniform(120, 180)
-        },
-        'Facebook Ads': {
-            'impressions': np.random.randint(12000, 20000),
-            'ctr': np.random.uniform(0.02, 0.04),
-            'conv_rate': np.random.uniform(0.05, 0.09),
-            'spend': np.random.uniform(600, 1200),
-            'avg_order_value': np.random.uniform(90, 140)
-        },
-        'Instagram Ads': {
-            'impressions': np.random.randint(10000, 18000),
-            'ctr': np.random.uniform(0.025, 0.045),
-            'conv_rate': np.random.uniform(0.04, 0.08),
-            'spend': np.random.uniform(500, 1000),
-            'avg_order_value': np.random.uniform(80, 120)
-        },
-        'LinkedIn Ads': {
-            'impressions': np.random.randint(3000, 6000),
-            'ctr': np.random.uniform(0.015, 0.03),
-            'conv_rate': np.random.uniform(0.10, 0.15),
-            'spend': np.random.uniform(900, 1800),
-            'avg_order_value': np.random.uniform(200, 350)
-        },
-        'Email Marketing': {
-            'impressions': np.random.randint(15000, 25000),
-            'ctr': np.random.uniform(0.15, 0.25),
-            'conv_rate': np.random.uniform(0.08, 0.14),
-            'spend': np.random.uniform(100, 300),
-            'avg_order_value': np.random.uniform(110, 160)
-        },
-        'Organic Search': {
-            'impressions': np.random.randint(20000, 35000),
-            'ctr': np.random.uniform(0.04, 0.08),
-            'conv_rate': np.random.uniform(0.10, 0.16),
-            'spend': 0,  # Organic = no ad spend
-            'avg_order_value': np.random.uniform(100, 150)
-        },
-        'Display Ads': {
-            'impressions': np.random.randint(25000, 40000),
-            'ctr': np.random.uniform(0.01, 0.02),
-            'conv_rate': np.random.uniform(0.02, 0.05),
-            'spend': np.random.uniform(700, 1300),
-            'avg_order_value': np.random.uniform(85, 130)
-        },
-        'YouTube Ads': {
-            'impressions': np.random.randint(15000, 25000),
-            'ctr': np.random.uniform(0.015, 0.03),
-            'conv_rate': np.random.uniform(0.04, 0.08),
-            'spend': np.random.uniform(800, 1400),
-            'avg_order_value': np.random.uniform(95, 145)
-        },
-        'Twitter Ads': {
-            'impressions': np.random.randint(8000, 14000),
-            'ctr': np.random.uniform(0.02, 0.035),
-            'conv_rate': np.random.uniform(0.03, 0.06),
-            'spend': np.random.uniform(400, 800),
-            'avg_order_value': np.random.uniform(75, 115)
-        },
-        'TikTok Ads': {
-            'impressions': np.random.randint(18000, 30000),
-            'ctr': np.random.uniform(0.025, 0.045),
-            'conv_rate': np.random.uniform(0.03, 0.07),
-            'spend': np.random.uniform(600, 1100),
-            'avg_order_value': np.random.uniform(70, 110)
-        },
-        'Affiliate Marketing': {
-            'impressions': np.random.randint(5000, 10000),
-            'ctr': np.random.uniform(0.04, 0.07),
-            'conv_rate': np.random.uniform(0.08, 0.13),
-            'spend': np.random.uniform(300, 700),
-            'avg_order_value': np.random.uniform(100, 150)
-        },
-        'Referral': {
-            'impressions': np.random.randint(3000, 7000),
-            'ctr': np.random.uniform(0.05, 0.10),
-            'conv_rate': np.random.uniform(0.12, 0.18),
-            'spend': np.random.uniform(50, 200),
-            'avg_order_value': np.random.uniform(120, 180)
-        }
-    }
-
-    profile = profiles[channel]
-    impressions = profile['impressions']
-    clicks = int(impressions * profile['ctr'])
-    conversions = int(clicks * profile['conv_rate'])
-
-    return {
-        'impressions': impressions,
-        'clicks': clicks,
-        'conversions': conversions,
-        'spend': profile['spend'],
-        'avg_order_value': profile['avg_order_value']
-    }
+def parse_args(argv=None):
+    """Command-line options for the generator"""
+
+    parser = argparse.ArgumentParser(description="Generate synthetic marketing campaign data")
+    parser.add_argument('--start', default=DEFAULT_START, help="first date (YYYY-MM-DD)")
+    parser.add_argument('--end', default=DEFAULT_END, help="last date (YYYY-MM-DD)")
+    parser.add_argument('--channels', type=int, default=len(CHANNELS),
+                        help="number of channels (extra channels reuse the base profiles)")
+    parser.add_argument('--rows-per-day', type=int, default=1,
+                        help="campaign rows per channel per day")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="random seed")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="CSV output path")
+    parser.add_argument('--stream', action='store_true',
+                        help="write in fixed-size chunks with bounded memory")
+    parser.add_argument('--chunk', default='MS',
+                        help="pandas frequency for stream chunk boundaries (default: monthly)")
+    parser.add_argument('--parquet', help="also write a Parquet copy (stream mode, needs pyarrow)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="generate stream shards in N processes (output is identical for any N)")
+    parser.add_argument('--compact', action='store_true',
+                        help="write only the base measures; derived ratios are computed at query time")
+    parser.add_argument('--trace', nargs='?', const=TRACE_PATH,
+                        help=f"record stage timings as JSON lines (default: {TRACE_PATH})")
+    parser.add_argument('--profile-dir', help="also write a cProfile .prof file per stage here")
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
+    args = parse_args()
+    configure(args.trace, args.profile_dir)
+
+    options = dict(
+        start_date=args.start,
+        end_date=args.end,
+        n_channels=args.channels,
+        rows_per_day=args.rows_per_day,
+        seed=args.seed,
+        output_path=args.output,
+        compact=args.compact
+    )
+
     # Generate the data
-    df = generate_marketing_data()
+    if args.stream or args.parquet or args.workers > 1:
+        stream_marketing_data(parquet_path=args.parquet, chunk_freq=args.chunk,
+                              workers=args.workers, **options)
+    else:
+        df = generate_marketing_data(**options)
 
-    print("\n✨ Data generation complete! Next step: SQL analysis")
\ No newline at end of file
+    print("\n✨ Data generation complete! Next step: SQL analysis")
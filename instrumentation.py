@@ -0,0 +1,156 @@
+"""
+Pipeline Instrumentation
+Opt-in stage timings, memory figures, SQLite query plans and cProfile
+output, written as JSON lines
+"""
+
+import cProfile
+import functools
+import itertools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Set to a file path ('-' for stderr) to record stage events
+TRACE_ENV = 'CAMPAIGN_TRACE'
+
+# Set to a directory to also write a cProfile .prof file per top-level stage
+PROFILE_ENV = 'CAMPAIGN_PROFILE_DIR'
+
+TRACE_PATH = 'data/trace.jsonl'
+
+_config = {
+    'trace': os.environ.get(TRACE_ENV) or None,
+    'profile_dir': os.environ.get(PROFILE_ENV) or None,
+}
+_local = threading.local()
+_write_lock = threading.Lock()
+_profile_ids = itertools.count()
+
+
+def configure(trace=None, profile_dir=None):
+    """Turn tracing on from command-line flags
+
+    The settings are also exported to the environment, so worker processes
+    started afterwards trace into the same file.
+    """
+
+    if trace:
+        _config['trace'] = os.environ[TRACE_ENV] = trace
+    if profile_dir:
+        _config['profile_dir'] = os.environ[PROFILE_ENV] = profile_dir
+        os.makedirs(profile_dir, exist_ok=True)
+        _config['trace'] = _config['trace'] or os.environ.setdefault(TRACE_ENV, TRACE_PATH)
+
+
+def enabled():
+    """True when stage events are being recorded"""
+    return _config['trace'] is not None
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def emit(event):
+    """Append one event to the trace as a JSON line"""
+
+    line = json.dumps(event, default=str) + '\n'
+    with _write_lock:
+        if _config['trace'] == '-':
+            sys.stderr.write(line)
+        else:
+            with open(_config['trace'], 'a') as f:
+                f.write(line)
+
+
+def add_rows(n):
+    """Count rows processed by the innermost stage running on this thread"""
+
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1]['rows'] = stack[-1].get('rows', 0) + int(n)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Record wall and CPU time, memory change and rows for a block
+
+    Yields the event dict, so the block can attach extra fields. Does
+    nothing, beyond yielding a throwaway dict, while tracing is off.
+    """
+
+    if not enabled():
+        yield {}
+        return
+
+    stack = _local.__dict__.setdefault('stack', [])
+    event = {'event': 'stage', 'name': name, **fields}
+    profiler = None
+    if _config['profile_dir'] and not stack:
+        # One profiler per thread at a time, so only top-level stages get one
+        profiler = cProfile.Profile()
+
+    stack.append(event)
+    rss_before = rss_mb()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield event
+    finally:
+        if profiler:
+            profiler.disable()
+        stack.pop()
+        event.update(
+            ts=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            pid=os.getpid(),
+            thread=threading.current_thread().name,
+            depth=len(stack),
+            wall_s=round(time.perf_counter() - wall, 6),
+            cpu_s=round(time.thread_time() - cpu, 6),
+            rss_mb=round(rss_mb(), 1),
+            rss_delta_mb=round(rss_mb() - rss_before, 1),
+        )
+        if profiler:
+            path = os.path.join(_config['profile_dir'], f"{name}-{os.getpid()}-{next(_profile_ids)}.prof")
+            profiler.dump_stats(path)
+            event['profile'] = path
+        emit(event)
+
+
+def traced(name=None):
+    """Decorator running a function as a stage named after it"""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with stage(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def query_plan(conn, sql, params=()):
+    """SQLite's EXPLAIN QUERY PLAN lines for a query"""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def full_scans(plan):
+    """Plan lines that read a whole table rather than an index range"""
+    return [line for line in plan
+            if line.startswith('SCAN ') and '(subquery' not in line and 'CONSTANT ROW' not in line]
@@ -0,0 +1,101 @@
+"""
+Metric Definitions
+Derived campaign metrics defined once, as SQL and as pandas, both per row
+and as ratios of summed measures
+"""
+
+import numpy as np
+
+# Additive measures stored for every row
+MEASURES = ['impressions', 'clicks', 'conversions', 'spend', 'revenue']
+
+# Ratio metrics: name -> (numerator, denominator, scale)
+RATIOS = {
+    'ctr': ('clicks', 'impressions', 100),
+    'conversion_rate': ('conversions', 'clicks', 100),
+    'cac': ('spend', 'conversions', 1),
+    'roas': ('revenue', 'spend', 1),
+}
+
+# Per-row columns derived from the measures, in CSV column order
+DERIVED_COLUMNS = ['ctr', 'conversion_rate', 'cac', 'roas', 'profit']
+
+# Decimal places the per-row derived values are stored with
+ROW_DECIMALS = 2
+
+
+def ratio_sql(name, numerator, denominator):
+    """SQL dividing two expressions for a ratio metric; NULL on a zero denominator"""
+
+    scale = RATIOS[name][2]
+    sql = f"CAST({numerator} AS FLOAT) / NULLIF({denominator}, 0)"
+    return f"{sql} * {scale}" if scale != 1 else sql
+
+
+def round_sql(expression, decimals=ROW_DECIMALS):
+    """SQL rounding half to even, like pandas' round(), so SQL and pandas agree exactly
+
+    SQLite's ROUND rounds halves away from zero, so values landing exactly
+    on a half are rounded to the even neighbour by hand.
+    """
+
+    scaled = f"({expression}) * {10 ** decimals}"
+    return (f"(CASE WHEN ABS({scaled} - ROUND({scaled})) = 0.5 THEN 2 * ROUND({scaled} / 2) "
+            f"ELSE ROUND({scaled}) END) / {10 ** decimals}")
+
+
+def row_sql(name):
+    """SQL for one row's derived value, equal to the generator's stored value
+
+    A zero denominator gives 0 rather than NULL, as in the generated CSV.
+    """
+
+    if name == 'profit':
+        return round_sql("revenue - spend")
+    numerator, denominator, _ = RATIOS[name]
+    return f"COALESCE({round_sql(ratio_sql(name, numerator, denominator))}, 0)"
+
+
+def total_sql(name):
+    """SQL for a metric over summed measures; ratios are ratios of sums"""
+
+    if name in MEASURES:
+        return f"SUM({name})"
+    if name == 'profit':
+        return "SUM(revenue) - SUM(spend)"
+    numerator, denominator, _ = RATIOS[name]
+    return ratio_sql(name, f"SUM({numerator})", f"SUM({denominator})")
+
+
+def total(name, totals):
+    """A metric from a frame of summed measures; NaN on a zero denominator, as NULLIF gives in SQL"""
+
+    if name in MEASURES:
+        return totals[name]
+    if name == 'profit':
+        return totals['revenue'] - totals['spend']
+    numerator, denominator, scale = RATIOS[name]
+    ratio = totals[numerator] / totals[denominator].where(totals[denominator] != 0)
+    return ratio * scale if scale != 1 else ratio
+
+
+def row_value(name, df):
+    """One derived column from a frame of rows, unrounded; inf or NaN on a zero denominator"""
+
+    if name == 'profit':
+        return df['revenue'] - df['spend']
+    numerator, denominator, scale = RATIOS[name]
+    ratio = df[numerator] / df[denominator]
+    return ratio * scale if scale != 1 else ratio
+
+
+def add_derived_columns(df):
+    """Add the per-row derived columns, replacing infinities and NaN with 0"""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived = {name: row_value(name, df) for name in DERIVED_COLUMNS}
+
+    for name, values in derived.items():
+        df[name] = values.replace([np.inf, -np.inf], 0).fillna(0).round(ROW_DECIMALS)
+
+    return df
@@ -0,0 +1,240 @@
+"""
+Partitioned Storage
+Optional month-partitioned copy of the campaigns table: one SQLite file per
+month, queried in parallel and merged from partial sums
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from campaign_query import DEFAULT_METRICS, DIMENSIONS, FILTERS, METRICS, filter_clauses
+from metrics import DERIVED_COLUMNS, MEASURES, total
+from sql_analysis import CAMPAIGN_INDEXES, DB_PATH, month_bounds
+
+PARTITION_DIR = 'data/partitions'
+
+# Month -> content fingerprint of each partition file
+MANIFEST = 'manifest.json'
+
+
+def partition_path(month, partition_dir=PARTITION_DIR):
+    """Partition file for a month: data/partitions/campaigns_<YYYY-MM>.db"""
+    return os.path.join(partition_dir, f"campaigns_{month}.db")
+
+
+def read_manifest(partition_dir=PARTITION_DIR):
+    """Month -> fingerprint for the partitions on disk"""
+
+    try:
+        with open(os.path.join(partition_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def month_fingerprints(conn):
+    """Month -> hash of its monthly segment rollup rows in the main database
+
+    The rollup holds every month's row counts and exact sums per channel,
+    campaign type and product, so a changed measure or relabelled row
+    changes its month's fingerprint without re-reading raw rows.
+    """
+
+    rows = conn.execute("SELECT * FROM rollup_monthly_segment "
+                        "ORDER BY month, channel, campaign_type, product, paid")
+    digests = {}
+    for row in rows:
+        digests.setdefault(row[0], hashlib.sha256()).update(repr(row).encode())
+    return {month: digest.hexdigest() for month, digest in digests.items()}
+
+
+def write_partition(db_path, month, path):
+    """Copy one month of campaigns from the main database into its own file"""
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None, uri=True)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute("ATTACH DATABASE ? AS source", (f"file:{db_path}?mode=ro",))
+        # Same columns as the source, which may be compact
+        columns = ', '.join(f"{name} {sql_type}" for name, sql_type in
+                            conn.execute("SELECT name, type FROM source.pragma_table_info('campaigns')"))
+        conn.execute(f"CREATE TABLE campaigns ({columns})")
+        conn.execute('BEGIN')
+        conn.execute("INSERT INTO campaigns SELECT * FROM source.campaigns WHERE date >= ? AND date < ?",
+                     month_bounds(month))
+        for sql in CAMPAIGN_INDEXES:
+            conn.execute(sql)
+        conn.execute('ANALYZE main')
+        conn.execute('COMMIT')
+        conn.execute('DETACH DATABASE source')
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+def sync_partitions(db_path=DB_PATH, partition_dir=PARTITION_DIR):
+    """Bring the partitions in line with the main database
+
+    Only months whose fingerprint changed are rewritten; files for months
+    no longer in the database are removed. Returns the rewritten months.
+    """
+
+    os.makedirs(partition_dir, exist_ok=True)
+    old = read_manifest(partition_dir)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        current = month_fingerprints(conn)
+    finally:
+        conn.close()
+
+    changed = [month for month, fingerprint in sorted(current.items())
+               if old.get(month) != fingerprint or not os.path.exists(partition_path(month, partition_dir))]
+    for month in changed:
+        write_partition(os.path.abspath(db_path), month, partition_path(month, partition_dir))
+    for month in set(old) - set(current):
+        os.remove(partition_path(month, partition_dir))
+
+    with open(os.path.join(partition_dir, MANIFEST), 'w') as f:
+        json.dump(current, f, indent=2)
+    return changed
+
+
+def partial_query(task):
+    """Additive partial sums for one partition; runs in a worker process"""
+
+    path, sql, params = task
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def partition_tasks(start=None, end=None, dimensions=(), partition_dir=PARTITION_DIR, **filters):
+    """(path, sql, params) per partition that overlaps [start, end]
+
+    Months outside the range are never opened, and months wholly inside it
+    need no date predicate.
+    """
+
+    dimension_sql = {'month': "strftime('%Y-%m', date)"}
+    select = [f"{dimension_sql.get(d, d)} as {d}" for d in dimensions]
+    select += ["COUNT(*) as rows"] + [f"SUM({m}) as {m}" for m in MEASURES]
+    clauses, params = filter_clauses(filters)
+
+    first, last = start and start[:7], end and end[:7]
+    tasks = []
+    for month in sorted(read_manifest(partition_dir)):
+        if (first and month < first) or (last and month > last):
+            continue
+
+        where, where_params = list(clauses), list(params)
+        if start and start[:7] == month and start[8:] not in ('', '01'):
+            where.insert(0, "date >= ?")
+            where_params.insert(0, start)
+        if end and end[:7] == month and len(end) > 7:
+            where.insert(0, "date <= ?")
+            where_params.insert(0, end)
+
+        sql = f"SELECT {', '.join(select)} FROM campaigns"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        if dimensions:
+            sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(dimensions)))}"
+        tasks.append((partition_path(month, partition_dir), sql, where_params))
+    return tasks
+
+
+def query_partitions(start=None, end=None, dimensions=(), metrics=None, order_by=None,
+                     partition_dir=PARTITION_DIR, workers=None, **filters):
+    """DataFrame for a slice over the partitions, with the arguments of compile_query
+
+    Each partition returns row counts and sums for its groups; these are
+    added up across partitions before ratios are computed, so ROAS, CAC
+    and the rates are ratios of totals rather than averages of ratios.
+    """
+
+    dimensions = list(dimensions)
+    metrics = list(metrics or DEFAULT_METRICS)
+    unknown = [f for f in filters if f not in FILTERS] + \
+              [d for d in dimensions if d not in DIMENSIONS] + \
+              [m for m in metrics if m not in METRICS] + \
+              [o for o in [order_by] if o and o not in metrics + dimensions]
+    if unknown:
+        raise ValueError(f"Unknown filters, dimensions or metrics: {unknown}")
+
+    tasks = partition_tasks(start, end, dimensions, partition_dir, **filters)
+    if not tasks:
+        # Like SQL: no groups, or one all-NULL row for a grand total
+        return pd.DataFrame(index=range(0 if dimensions else 1), columns=dimensions + metrics, dtype=float)
+
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        partials = [partial_query(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(executor.map(partial_query, tasks))
+
+    totals = pd.concat(partials, ignore_index=True)
+    if dimensions:
+        totals = totals.groupby(dimensions, as_index=False, sort=True).sum()
+    else:
+        totals = totals.sum().to_frame().T.astype(totals.dtypes)
+
+    # Derived metrics from the merged sums (metrics.total), so a zero
+    # denominator gives NaN as NULLIF does in SQL
+    for name in DERIVED_COLUMNS:
+        if name in metrics:
+            totals[name] = total(name, totals)
+
+    result = totals[dimensions + metrics]
+    if order_by:
+        result = result.sort_values(order_by, ascending=False, kind='stable')
+    return result.reset_index(drop=True)
+
+
+def main(argv=None):
+    """Sync the partitions, then optionally run a slice across them"""
+
+    parser = argparse.ArgumentParser(description="Maintain and query month-partitioned campaign data")
+    parser.add_argument('--start', help="first date (YYYY-MM-DD or YYYY-MM)")
+    parser.add_argument('--end', help="last date (YYYY-MM-DD or YYYY-MM)")
+    parser.add_argument('--dimension', action='append', default=[], choices=DIMENSIONS)
+    parser.add_argument('--metric', action='append', choices=list(METRICS))
+    parser.add_argument('--channel', action='append')
+    parser.add_argument('--campaign-type', action='append')
+    parser.add_argument('--product', action='append')
+    parser.add_argument('--workers', type=int, help="processes to fan out over (default: all cores)")
+    args = parser.parse_args(argv)
+
+    print("🗂️  Syncing month partitions...")
+    start = time.time()
+    changed = sync_partitions()
+    print(f"✅ Rewrote {len(changed)} partition(s) in {time.time() - start:.2f}s")
+
+    if args.dimension or args.metric or args.start or args.end:
+        start = time.time()
+        df = query_partitions(args.start, args.end, args.dimension, args.metric, workers=args.workers,
+                              channel=args.channel, campaign_type=args.campaign_type, product=args.product)
+        print(df.to_string(index=False))
+        print(f"\n⏱️  {(time.time() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
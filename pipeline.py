@@ -0,0 +1,353 @@
+"""
+Pipeline Runner
+Runs generate -> ingest -> reports and charts as a DAG, skipping any task
+whose inputs are unchanged since its last successful run
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+STATE_PATH = 'data/.pipeline.json'
+
+CSV_PATH = 'data/marketing_campaigns.csv'
+DB_PATH = 'data/marketing_analysis.db'
+
+HASH_BLOCK = 1 << 20
+
+
+def local_imports(path):
+    """Source files of the repo's own modules imported anywhere in a file, lazy imports included"""
+
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return {f"{name}.py" for name in names if os.path.exists(f"{name}.py")}
+
+
+def module_sources(entry):
+    """A module's source file and every local module it imports, transitively, sorted"""
+
+    sources, pending = set(), [entry]
+    while pending:
+        path = pending.pop()
+        if path not in sources and os.path.exists(path):
+            sources.add(path)
+            pending.extend(local_imports(path))
+    return sorted(sources)
+
+
+# Source files each kind of task depends on, besides its data inputs: the
+# stage's module and everything it imports, so a new helper module is never missed
+GENERATE_SOURCES = module_sources('generate_marketing_data.py')
+INGEST_SOURCES = module_sources('sql_analysis.py')
+CHART_SOURCES = module_sources('create_dashboard.py')
+
+
+class Task:
+    """One node of the pipeline: what it reads, what it writes and how to run it
+
+    inputs are files whose contents feed the digest; params is any other
+    value that changes the result (such as a query's SQL). A task with adopt
+    set keeps existing outputs when it has never run, so a pipeline started
+    over hand-made data does not overwrite it.
+    """
+
+    def __init__(self, name, action, deps=(), inputs=(), params=None, outputs=(), adopt=False):
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.params = params
+        self.outputs = list(outputs)
+        self.adopt = adopt
+
+
+def stat_key(path):
+    """[size, mtime_ns] of a file, or None when it does not exist"""
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def file_hash(path, cache):
+    """SHA-256 of a file's contents, reused from cache while its size and mtime match"""
+
+    key = stat_key(path)
+    if key is None:
+        return None
+    cached = cache.get(path)
+    if cached and cached[:2] == key:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    cache[path] = key + [digest.hexdigest()]
+    return cache[path][2]
+
+
+def sources_digest(paths, hash_cache):
+    """Digest of a list of source files' contents"""
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(f"{path}:{file_hash(path, hash_cache)}".encode())
+    return digest.hexdigest()
+
+
+def task_digest(task, digests, hash_cache):
+    """Digest of everything a task's result depends on, including its dependencies"""
+
+    digest = hashlib.sha256(task.name.encode())
+    digest.update(repr(task.params).encode())
+    for path in task.inputs:
+        digest.update(f"{path}:{file_hash(path, hash_cache)}".encode())
+    for dep in task.deps:
+        digest.update(digests[dep].encode())
+    return digest.hexdigest()
+
+
+def read_state(path=STATE_PATH):
+    """Recorded digests, file hashes and the last run's stamp"""
+
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+    for key in ('tasks', 'hashes', 'stamp'):
+        state.setdefault(key, {})
+    return state
+
+
+def write_state(state, path=STATE_PATH):
+    """Save the state atomically"""
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def stamp_current(stamp):
+    """True when every file recorded after the last full run is unchanged"""
+    return bool(stamp) and all(stat_key(path) == key for path, key in stamp.items())
+
+
+def run_tasks(tasks, state, force=False, workers=None):
+    """Run the DAG, independent ready tasks in parallel; returns {name: 'ran' | 'skipped'}"""
+
+    by_name = {task.name: task for task in tasks}
+    remaining = list(tasks)
+    digests, outcomes, futures = {}, {}, {}
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        while remaining or futures:
+            # Start (or skip) every task whose dependencies have finished
+            ready = [task for task in remaining if all(outcomes.get(dep) for dep in task.deps)]
+            for task in ready if failure is None else []:
+                remaining.remove(task)
+                digests[task.name] = task_digest(task, digests, state['hashes'])
+                recorded = state['tasks'].get(task.name)
+                outputs_exist = all(os.path.exists(path) for path in task.outputs)
+                if task.adopt and recorded is None and task.outputs and outputs_exist and not force:
+                    recorded = state['tasks'][task.name] = digests[task.name]
+                if not force and recorded == digests[task.name] and outputs_exist:
+                    outcomes[task.name] = 'skipped'
+                    print(f"   ⏭️  {task.name}")
+                    continue
+                futures[pool.submit(timed_action, task)] = task
+
+            if not futures:
+                if ready and failure is None:
+                    continue
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as error:
+                    failure = failure or error
+                    print(f"   ❌ {task.name}: {error}")
+                    continue
+                state['tasks'][task.name] = digests[task.name]
+                outcomes[task.name] = 'ran'
+                print(f"   ✅ {task.name} ({seconds:.2f}s)")
+
+    if failure is not None:
+        raise failure
+    missing = [name for name in by_name if name not in outcomes]
+    if missing:
+        raise RuntimeError(f"Tasks never became ready: {missing}")
+    return outcomes
+
+
+def timed_action(task):
+    """Run a task's action; returns its wall time"""
+
+    start = time.perf_counter()
+    task.action()
+    return time.perf_counter() - start
+
+
+class ChartData:
+    """Loads the dashboard data once, on the first chart that needs it"""
+
+    def __init__(self):
+        self.cube = self.daily = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        import create_dashboard as dashboard
+
+        with self.lock:
+            if self.cube is None:
+                df = dashboard.load_data()
+                self.daily = dashboard.daily_channel_series(df)
+                self.cube = dashboard.build_cube(df)
+        return self
+
+
+def save_chart(name, cube, daily):
+    """Render one chart to dashboards/<name>.html (runs in a worker process)"""
+
+    import create_dashboard as dashboard
+
+    if name == 'daily_revenue':
+        dashboard.create_daily_trend_chart(daily, metric='revenue')
+    else:
+        dashboard.CHARTS[name](cube)
+
+
+def build_tasks(state, force=False, chart_workers=1):
+    """The pipeline DAG: generate, ingest, one task per report and per chart"""
+
+    import create_dashboard as dashboard
+    import generate_marketing_data as generator
+    import sql_analysis
+
+    def ingest():
+        # A refresh only loads rows appended to the CSV, so changed ingest code
+        # (or --force) needs a full rebuild to reach the existing rows
+        sources = sources_digest(INGEST_SOURCES, state['hashes'])
+        if not force and state.get('ingest_sources') == sources:
+            sql_analysis.refresh_database(CSV_PATH, DB_PATH)
+        else:
+            sql_analysis.create_database(CSV_PATH, DB_PATH)
+        state['ingest_sources'] = sources
+
+    tasks = [
+        Task('generate', lambda: generator.generate_marketing_data(output_path=CSV_PATH),
+             inputs=GENERATE_SOURCES,
+             params={'start': generator.DEFAULT_START, 'end': generator.DEFAULT_END,
+                     'seed': generator.DEFAULT_SEED},
+             outputs=[CSV_PATH], adopt=True),
+        Task('ingest', ingest,
+             deps=['generate'], inputs=[CSV_PATH] + INGEST_SOURCES, outputs=[DB_PATH]),
+    ]
+
+    executor = sql_analysis.QueryExecutor(DB_PATH)
+
+    def report(name, sql):
+        def action():
+            executor.query(sql, name=name).to_csv(sql_analysis.report_csv_path(name), index=False)
+        return action
+
+    for name, sql in sql_analysis.REPORTS.items():
+        tasks.append(Task(f"report:{name}", report(name, sql), deps=['ingest'], params=sql,
+                          outputs=[sql_analysis.report_csv_path(name)]))
+
+    data = ChartData()
+    chart_pool = ProcessPoolExecutor(max_workers=chart_workers) if chart_workers > 1 else None
+
+    def chart(name):
+        def action():
+            os.makedirs(dashboard.DASHBOARD_DIR, exist_ok=True)
+            data.load()
+            if chart_pool is None:
+                save_chart(name, data.cube, data.daily)
+            else:
+                chart_pool.submit(save_chart, name, data.cube, data.daily).result()
+        return action
+
+    # The budget what-if chart is opt-in (create_dashboard.py --scenarios), as
+    # its Monte Carlo run costs more than every other chart together
+    for name in list(dashboard.CHARTS) + ['daily_revenue']:
+        tasks.append(Task(f"chart:{name}", chart(name), deps=['generate'],
+                          inputs=[CSV_PATH] + CHART_SOURCES,
+                          outputs=[f"{dashboard.DASHBOARD_DIR}/{name}.html"]))
+
+    def close():
+        executor.close()
+        if chart_pool is not None:
+            chart_pool.shutdown()
+
+    return tasks, close
+
+
+def run_pipeline(force=False, workers=None):
+    """Bring every output up to date; returns {task: 'ran' | 'skipped'}, or {} when nothing changed"""
+
+    state = read_state()
+    if not force and stamp_current(state['stamp']):
+        return {}
+
+    tasks, close = build_tasks(state, force, chart_workers=min(workers or os.cpu_count() or 1, 5))
+    try:
+        outcomes = run_tasks(tasks, state, force, workers)
+    finally:
+        close()
+        write_state(state)
+
+    # Every file the DAG read or wrote, plus the pipeline itself
+    paths = {__file__} | {path for task in tasks for path in task.inputs + task.outputs}
+    state['stamp'] = {path: stat_key(path) for path in sorted(paths)}
+    write_state(state)
+    return outcomes
+
+
+def main(argv=None):
+    """Run the pipeline from the command line"""
+
+    parser = argparse.ArgumentParser(description="Run the marketing pipeline, skipping unchanged stages")
+    parser.add_argument('--force', action='store_true', help="rerun every task")
+    parser.add_argument('--workers', type=int, help="tasks run at once (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    print("🔁 Running pipeline...")
+    try:
+        outcomes = run_pipeline(args.force, args.workers)
+    except Exception:
+        print("❌ Pipeline failed; finished tasks are recorded and will be skipped next run")
+        raise
+
+    ran = sum(outcome == 'ran' for outcome in outcomes.values())
+    if not outcomes:
+        print("✨ Everything is up to date")
+    else:
+        print(f"✨ Ran {ran} task(s), skipped {len(outcomes) - ran}")
+    print(f"⏱️  {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
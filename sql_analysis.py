@@ -3,142 +3,1002 @@ SQL Analysis Script for Marketing Campaigns
 Creates SQLite database and runs analysis queries
 """
 
+import argparse
+import hashlib
+import os
+import pickle
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 from pathlib import Path
 
+from campaign_data import CSV_PATH, cached_chunks, read_campaign_chunks, read_column_cache
+from instrumentation import TRACE_PATH, add_rows, configure, enabled, full_scans, query_plan, stage, traced
+from metrics import DERIVED_COLUMNS, row_sql
+
+DB_PATH = 'data/marketing_analysis.db'
+
+# Rows per read/insert batch; memory use is bounded by this, not the file size
+CHUNK_SIZE = 100_000
+
+# Explicit column types for the campaigns table, in CSV column order. Compact
+# storage leaves out the derived columns (see metrics.py).
+CAMPAIGN_COLUMNS = [
+    ('date', 'DATE'),
+    ('channel', 'TEXT'),
+    ('campaign_type', 'TEXT'),
+    ('product', 'TEXT'),
+    ('impressions', 'INTEGER'),
+    ('clicks', 'INTEGER'),
+    ('conversions', 'INTEGER'),
+    ('spend', 'REAL'),
+    ('revenue', 'REAL'),
+    ('ctr', 'REAL'),
+    ('conversion_rate', 'REAL'),
+    ('cac', 'REAL'),
+    ('roas', 'REAL'),
+    ('profit', 'REAL'),
+]
+
+# Trade durability for speed while bulk loading into a fresh file
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA locking_mode = EXCLUSIVE',
+]
+
+RESULT_CACHE_PATH = 'data/query_cache.db'
+
+# Total pickled result size kept before least-recently-used entries are evicted
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Bytes before the last ingested offset used to detect a rewritten CSV
+TAIL_FINGERPRINT_BYTES = 4096
+
+# Read size when hashing ingested CSV bytes
+HASH_BLOCK = 1 << 20
+
+# Secondary indexes for the dimension filters, each also ordered by date so a
+# filter plus a date range is a single index range scan
+CAMPAIGN_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_channel_date ON campaigns (channel, date)",
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_campaign_type_date ON campaigns (campaign_type, date)",
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_product_date ON campaigns (product, date)",
+]
+
+# Target sample rows per month x channel stratum for approximate answers
+SAMPLE_SIZE = 200
+
+# Pre-aggregated rollups, all keyed by day or month so they can be rebuilt one
+# month at a time. Each SELECT takes a {where} clause restricting the raw rows;
+# per-row derived columns are read through the campaign_metrics view.
+ROLLUPS = {
+    'rollup_daily_channel': ("""
+        CREATE TABLE IF NOT EXISTS rollup_daily_channel (
+            date                DATE    NOT NULL,
+            channel             TEXT    NOT NULL,
+            n_rows              INTEGER NOT NULL,
+            impressions         INTEGER,
+            clicks              INTEGER,
+            conversions         INTEGER,
+            spend               REAL,
+            revenue             REAL,
+            sum_ctr             REAL,
+            sum_conversion_rate REAL,
+            PRIMARY KEY (date, channel)
+        )""", """
+        SELECT date, channel, COUNT(*), SUM(impressions), SUM(clicks), SUM(conversions),
+               SUM(spend), SUM(revenue), SUM(ctr), SUM(conversion_rate)
+        FROM campaign_metrics {where}
+        GROUP BY date, channel"""),
+    'rollup_monthly_channel': ("""
+        CREATE TABLE IF NOT EXISTS rollup_monthly_channel (
+            month       TEXT    NOT NULL,
+            channel     TEXT    NOT NULL,
+            converting  INTEGER NOT NULL,
+            n_rows      INTEGER NOT NULL,
+            impressions INTEGER,
+            clicks      INTEGER,
+            conversions INTEGER,
+            spend       REAL,
+            revenue     REAL,
+            PRIMARY KEY (month, channel, converting)
+        )""", """
+        SELECT strftime('%Y-%m', date), channel, conversions > 0, COUNT(*),
+               SUM(impressions), SUM(clicks), SUM(conversions), SUM(spend), SUM(revenue)
+        FROM campaigns {where}
+        GROUP BY 1, 2, 3"""),
+    'rollup_monthly_segment': ("""
+        CREATE TABLE IF NOT EXISTS rollup_monthly_segment (
+            month         TEXT    NOT NULL,
+            channel       TEXT    NOT NULL,
+            campaign_type TEXT    NOT NULL,
+            product       TEXT    NOT NULL,
+            paid          INTEGER NOT NULL,
+            n_rows        INTEGER NOT NULL,
+            impressions   INTEGER,
+            clicks        INTEGER,
+            conversions   INTEGER,
+            spend         REAL,
+            revenue       REAL,
+            PRIMARY KEY (month, channel, campaign_type, product, paid)
+        )""", """
+        SELECT strftime('%Y-%m', date), channel, campaign_type, product, spend > 0, COUNT(*),
+               SUM(impressions), SUM(clicks), SUM(conversions), SUM(spend), SUM(revenue)
+        FROM campaigns {where}
+        GROUP BY 1, 2, 3, 4, 5"""),
+    # Stratified sample: each row is kept when a hash of its rowid falls under
+    # its month x channel stratum's cutoff, about SAMPLE_SIZE rows per stratum
+    # in one scan. Built after rollup_monthly_channel, which gives the sizes.
+    'sample_campaigns': ("""
+        CREATE TABLE IF NOT EXISTS sample_campaigns (
+            month         TEXT    NOT NULL,
+            channel       TEXT    NOT NULL,
+            date          DATE    NOT NULL,
+            campaign_type TEXT,
+            product       TEXT,
+            impressions   INTEGER,
+            clicks        INTEGER,
+            conversions   INTEGER,
+            spend         REAL,
+            revenue       REAL
+        )""", f"""
+        WITH strata AS (
+            SELECT month, channel, 4294967296.0 * {SAMPLE_SIZE} / SUM(n_rows) as cutoff
+            FROM rollup_monthly_channel
+            GROUP BY month, channel
+        )
+        SELECT strftime('%Y-%m', c.date), c.channel, c.date, c.campaign_type, c.product,
+               c.impressions, c.clicks, c.conversions, c.spend, c.revenue
+        FROM (SELECT rowid * 2654435761 % 4294967296 as draw, * FROM campaigns {{where}}) c
+        CROSS JOIN strata s ON s.channel = c.channel AND s.month = strftime('%Y-%m', c.date)
+        WHERE c.draw < (SELECT MAX(cutoff) FROM strata) AND c.draw < s.cutoff"""),
+}
+
+# Trailing 7- and 28-day channel metrics, one row per channel per day. Window
+# frames are RANGE over the day number, so days with no rows still count
+# towards the window's length. The _wow columns compare each 7-day window
+# with the 7 days before it. Derived from rollup_daily_channel, and rebuilt
+# from the first changed day onwards, reading back far enough to fill the
+# longest window. Money sums are rounded to cents, as in the CSV, because a
+# sliding SUM adds and subtracts as the frame moves and would otherwise
+# drift with the partition's length, so a full and an incremental build
+# could differ in the last digits.
+ROLLING_LOOKBACK_DAYS = 27
+
+ROLLING_TABLE = """
+    CREATE TABLE IF NOT EXISTS rolling_channel_metrics (
+        date            DATE NOT NULL,
+        channel         TEXT NOT NULL,
+        spend_7d        REAL,
+        revenue_7d      REAL,
+        conversions_7d  INTEGER,
+        roas_7d         REAL,
+        cac_7d          REAL,
+        spend_28d       REAL,
+        revenue_28d     REAL,
+        conversions_28d INTEGER,
+        roas_28d        REAL,
+        cac_28d         REAL,
+        roas_7d_wow     REAL,
+        cac_7d_wow      REAL,
+        PRIMARY KEY (channel, date)
+    )"""
+
+ROLLING_SELECT = """
+    WITH windows AS (
+        SELECT date, channel,
+               ROUND(SUM(spend) OVER w7, 2) as spend_7d,
+               ROUND(SUM(revenue) OVER w7, 2) as revenue_7d,
+               SUM(conversions) OVER w7 as conversions_7d,
+               ROUND(SUM(spend) OVER w28, 2) as spend_28d,
+               ROUND(SUM(revenue) OVER w28, 2) as revenue_28d,
+               SUM(conversions) OVER w28 as conversions_28d,
+               ROUND(SUM(spend) OVER prior7, 2) as prior_spend,
+               ROUND(SUM(revenue) OVER prior7, 2) as prior_revenue,
+               SUM(conversions) OVER prior7 as prior_conversions
+        FROM rollup_daily_channel
+        WHERE date >= ?
+        WINDOW days AS (PARTITION BY channel ORDER BY julianday(date)),
+               w7 AS (days RANGE BETWEEN 6 PRECEDING AND CURRENT ROW),
+               w28 AS (days RANGE BETWEEN 27 PRECEDING AND CURRENT ROW),
+               prior7 AS (days RANGE BETWEEN 13 PRECEDING AND 7 PRECEDING)
+    )
+    SELECT date, channel,
+           spend_7d, revenue_7d, conversions_7d,
+           revenue_7d / NULLIF(spend_7d, 0),
+           spend_7d / NULLIF(conversions_7d, 0),
+           spend_28d, revenue_28d, conversions_28d,
+           revenue_28d / NULLIF(spend_28d, 0),
+           spend_28d / NULLIF(conversions_28d, 0),
+           revenue_7d / NULLIF(spend_7d, 0) - prior_revenue / NULLIF(prior_spend, 0),
+           spend_7d / NULLIF(conversions_7d, 0) - prior_spend / NULLIF(prior_conversions, 0)
+    FROM windows
+    WHERE date >= ?"""
+
+# Normal settings restored once the load has committed; WAL lets readers run concurrently
+DEFAULT_PRAGMAS = [
+    'PRAGMA locking_mode = NORMAL',
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = FULL',
+]
+
+
+def create_campaigns_table(conn, compact=False):
+    """Create the campaigns table with an explicit typed schema"""
+
+    columns = ',\n    '.join(f"{name} {sql_type}" for name, sql_type in CAMPAIGN_COLUMNS
+                            if not (compact and name in DERIVED_COLUMNS))
+    conn.execute(f"CREATE TABLE campaigns (\n    {columns}\n)")
+
+
+def create_metrics_view(conn):
+    """Create campaign_metrics: every campaigns column plus any derived column it lacks
+
+    On compact storage the derived values are computed per row, equal to
+    those the generator writes; otherwise the view just passes rows through.
+    """
+
+    stored = table_columns(conn)
+    derived = ''.join(f", {row_sql(name)} as {name}" for name in DERIVED_COLUMNS if name not in stored)
+    conn.execute(f"CREATE VIEW IF NOT EXISTS campaign_metrics AS SELECT *{derived} FROM campaigns")
+
+
+def column_names(compact=False):
+    """Names of the campaigns table columns, in order"""
+    return [name for name, _ in CAMPAIGN_COLUMNS if not (compact and name in DERIVED_COLUMNS)]
+
+
+def table_columns(conn):
+    """Names of the columns the campaigns table was created with"""
+    return [row[1] for row in conn.execute("PRAGMA table_info(campaigns)")]
+
+
+def insert_chunk(conn, chunk, upsert=False):
+    """Insert one chunk with executemany as plain Python values
+
+    With upsert, rows whose (date, channel) key already exists replace the
+    stored values instead of adding a duplicate. Only the table's columns
+    present in the chunk are written.
+    """
+
+    names = [name for name in column_names() if name in chunk]
+    placeholders = ', '.join('?' for _ in names)
+    sql = f"INSERT INTO campaigns ({', '.join(names)}) VALUES ({placeholders})"
+    if upsert:
+        updates = ', '.join(f"{name} = excluded.{name}" for name in names[2:])
+        sql += f" ON CONFLICT (date, channel) DO UPDATE SET {updates}"
+
+    rows = zip(*(chunk[name].tolist() for name in names))
+    conn.executemany(sql, rows)
+
+
+def create_ingest_tables(conn):
+    """Create the ingest bookkeeping tables
+
+    ingest_state holds the CSV read position and the date high-water mark;
+    ingest_log records one row per load and ingest_months the months an
+    incremental load touched, so readers can tell what changed.
+    """
+
+    conn.execute("CREATE TABLE IF NOT EXISTS ingest_state (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_months (
+            batch_id INTEGER NOT NULL,
+            month    TEXT    NOT NULL,
+            PRIMARY KEY (batch_id, month)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_log (
+            batch_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingested_at TEXT    NOT NULL,
+            mode        TEXT    NOT NULL,
+            rows        INTEGER NOT NULL,
+            min_date    DATE,
+            max_date    DATE
+        )""")
+
+
+def repeats_key(chunk, previous=None):
+    """Whether any row shares its (date, channel) with the row just before it
+
+    previous is the last (date, channel) of the preceding chunk; returns the
+    flag and this chunk's last key, to carry into the next chunk.
+    """
+
+    if chunk.empty:
+        return False, previous
+    dates, channels = chunk['date'].to_numpy(), chunk['channel'].to_numpy()
+    repeated = ((dates[1:] == dates[:-1]) & (channels[1:] == channels[:-1])).any()
+    first, last = (dates[0], channels[0]), (dates[-1], channels[-1])
+    return bool(repeated) or first == previous, last
+
+
+@traced()
+def create_campaign_key(conn, repeated_runs=False):
+    """Enforce one row per (date, channel), the key incremental refresh upserts on
+
+    A row repeating an earlier (date, channel) further down the CSV is a
+    correction, as an incremental refresh would upsert it, so only the last
+    row of each key is kept. Returns False when the data has several
+    consecutive rows per channel per day (repeated_runs), in which case
+    every row is kept, incremental refresh is unavailable and reloads fall
+    back to a full rebuild.
+    """
+
+    # Checked up front: a failed CREATE UNIQUE INDEX cannot be rolled back
+    # while bulk loading with the journal off
+    duplicate = conn.execute(
+        "SELECT 1 FROM campaigns GROUP BY date, channel HAVING COUNT(*) > 1 LIMIT 1"
+    ).fetchone()
+    if duplicate and not repeated_runs:
+        # Rows were inserted in CSV order, so the highest rowid is the latest
+        conn.execute("""
+            DELETE FROM campaigns WHERE rowid IN (
+                SELECT c.rowid
+                FROM campaigns c
+                JOIN (SELECT date, channel, MAX(rowid) as last_rowid
+                      FROM campaigns GROUP BY date, channel HAVING COUNT(*) > 1) latest
+                  ON c.date = latest.date AND c.channel = latest.channel
+                 AND c.rowid < latest.last_rowid
+            )""")
+        duplicate = None
+    unique = 'INDEX' if duplicate else 'UNIQUE INDEX'
+    conn.execute(f"CREATE {unique} idx_campaigns_date_channel ON campaigns (date, channel)")
+    return duplicate is None
+
+
+def read_ingest_state(conn):
+    """Stored ingest state as a dict, empty if the database predates it"""
+
+    try:
+        return dict(conn.execute("SELECT key, value FROM ingest_state"))
+    except sqlite3.OperationalError:
+        return {}
+
+
+def record_ingest(conn, mode, rows, min_date, max_date, csv_offset, csv_path, keyed=None,
+                  months=()):
+    """Log a load and advance the stored CSV offset and high-water mark"""
+
+    state = read_ingest_state(conn)
+    high_water_mark = max(filter(None, [state.get('high_water_mark'), max_date]), default=None)
+    header = state.get('csv_header') or read_csv_header(csv_path)
+
+    batch_id = conn.execute(
+        "INSERT INTO ingest_log (ingested_at, mode, rows, min_date, max_date) VALUES (?, ?, ?, ?, ?)",
+        (time.strftime('%Y-%m-%dT%H:%M:%S'), mode, rows, min_date, max_date)
+    ).lastrowid
+    conn.executemany("INSERT INTO ingest_months (batch_id, month) VALUES (?, ?)",
+                     [(batch_id, month) for month in sorted(months)])
+    new_state = {
+        'csv_offset': str(csv_offset),
+        'csv_tail_hash': csv_tail_hash(csv_path, csv_offset),
+        'csv_header': header,
+        'high_water_mark': high_water_mark,
+        # Derived from the loaded content, so cached results can tell the data
+        # changed while an identical reload keeps them
+        'load_id': content_hash(csv_path, int(state.get('csv_offset', 0)), csv_offset,
+                                state.get('load_id', '')),
+    }
+    if keyed is not None:
+        new_state['keyed'] = '1' if keyed else '0'
+    conn.executemany("INSERT OR REPLACE INTO ingest_state (key, value) VALUES (?, ?)",
+                     new_state.items())
+
+
+def content_hash(csv_path, start, end, previous=''):
+    """SHA-256 of the CSV bytes a load read, chained onto the previous load's hash
+
+    The rollup and metric definitions are hashed in too, so a changed
+    definition gives rebuilt tables a new hash even from the same CSV.
+    """
+
+    digest = hashlib.sha256(previous.encode())
+    digest.update(repr((ROLLUPS, ROLLING_SELECT, [row_sql(name) for name in DERIVED_COLUMNS])).encode())
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0 and (block := f.read(min(HASH_BLOCK, remaining))):
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+@traced()
+def create_indexes(conn):
+    """Create the secondary indexes on the campaigns table"""
+
+    for sql in CAMPAIGN_INDEXES:
+        conn.execute(sql)
+
+
+@traced()
+def build_rollups(conn, months=None):
+    """(Re)build the rollup tables, either entirely or for the given months only"""
+
+    for table, (create_sql, select_sql) in ROLLUPS.items():
+        conn.execute(create_sql)
+
+        if months is None:
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(f"INSERT INTO {table} {select_sql.format(where='')}")
+            continue
+
+        for month in sorted(months):
+            start, end = month_bounds(month)
+            if table == 'rollup_daily_channel':
+                conn.execute(f"DELETE FROM {table} WHERE date >= ? AND date < ?", (start, end))
+            else:
+                conn.execute(f"DELETE FROM {table} WHERE month = ?", (month,))
+            conn.execute(f"INSERT INTO {table} {select_sql.format(where='WHERE date >= ? AND date < ?')}",
+                         (start, end))
+
+    if months is None:
+        build_rolling_metrics(conn)
+    elif months:
+        build_rolling_metrics(conn, month_bounds(min(months))[0])
+
+
+@traced()
+def build_rolling_metrics(conn, since=None):
+    """(Re)build the rolling channel metrics, entirely or for days from since onwards
+
+    One windowed pass over the daily rollup computes every window; an
+    incremental update only reads the days it rewrites plus the longest
+    window's lookback.
+    """
+
+    conn.execute(ROLLING_TABLE)
+    if since is None:
+        conn.execute("DELETE FROM rolling_channel_metrics")
+        lookback = since = ''
+    else:
+        conn.execute("DELETE FROM rolling_channel_metrics WHERE date >= ?", (since,))
+        lookback = conn.execute("SELECT date(?, ?)", (since, f"-{ROLLING_LOOKBACK_DAYS} days")).fetchone()[0]
+    conn.execute(f"INSERT INTO rolling_channel_metrics {ROLLING_SELECT}", (lookback, since))
+
+
+def month_bounds(month):
+    """First day of a 'YYYY-MM' month and of the month after it"""
+
+    year, mon = (int(part) for part in month.split('-'))
+    next_year, next_mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}-01", f"{next_year:04d}-{next_mon:02d}-01"
+
+
+def read_csv_header(csv_path):
+    """First line of the CSV, without the newline"""
+
+    with open(csv_path, 'rb') as f:
+        return f.readline().decode().rstrip('\r\n')
+
+
+def csv_tail_hash(csv_path, offset):
+    """Hash of the bytes just before offset, to detect a rewritten (not appended) file"""
+
+    with open(csv_path, 'rb') as f:
+        f.seek(max(0, offset - TAIL_FINGERPRINT_BYTES))
+        return hashlib.sha256(f.read(min(offset, TAIL_FINGERPRINT_BYTES))).hexdigest()
+
+
+@traced()
+def create_database(csv_path=CSV_PATH, db_path=DB_PATH, chunksize=CHUNK_SIZE, compact=False):
+    """Bulk-load the CSV into SQLite in chunked transactions
 
-def create_database():
-    """Load CSV into SQLite database"""
+    The database is built in a temporary file with bulk-load PRAGMAs and
+    then atomically swapped in, so readers never see a half-built table.
+    With compact, or when the CSV has no derived columns, only the base
+    measures are stored and campaign_metrics computes the rest. Corrections
+    appended to the CSV replace the earlier row, as refresh_database's
+    upserts do.
+    """
 
     print("📊 Creating SQLite database...")
 
-    # Read CSV
-    df = pd.read_csv('data/marketing_campaigns.csv')
+    start = time.perf_counter()
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
 
-    # Create SQLite connection
-    conn = sqlite3.connect('data/marketing_analysis.db')
+    # Create SQLite connection; transactions are managed explicitly
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    total_rows = 0
 
-    # Write to database
-    df.to_sql('campaigns', conn, if_exists='replace', index=False)
+    try:
+        for pragma in BULK_LOAD_PRAGMAS:
+            conn.execute(pragma)
+
+        compact = compact or not set(DERIVED_COLUMNS) <= set(read_csv_header(csv_path).split(','))
+        columns = column_names(compact)
+        create_campaigns_table(conn, compact)
+        create_metrics_view(conn)
+        create_ingest_tables(conn)
+
+        # Write to database, one transaction per chunk
+        min_date = max_date = last_key = None
+        repeated_runs = False
+        cached = read_column_cache(csv_path)
+        with open(csv_path, 'rb') as csv_file:
+            # The columnar cache, when current, saves parsing the CSV again
+            if cached:
+                chunks = cached_chunks(*cached, chunksize, columns)
+            else:
+                chunks = read_campaign_chunks(csv_file, chunksize, columns=columns)
+
+            for chunk in chunks:
+                conn.execute('BEGIN')
+                insert_chunk(conn, chunk)
+                conn.execute('COMMIT')
+                repeated, last_key = repeats_key(chunk, last_key)
+                repeated_runs = repeated_runs or repeated
+                total_rows += len(chunk)
+                add_rows(len(chunk))
+                min_date = min(filter(None, [min_date, chunk['date'].min()]))
+                max_date = max(filter(None, [max_date, chunk['date'].max()]))
+            csv_offset = cached[1]['source']['size'] if cached else csv_file.tell()
+
+        conn.execute('BEGIN')
+        keyed = create_campaign_key(conn, repeated_runs)
+        create_indexes(conn)
+        build_rollups(conn)
+        # Index statistics, so the planner picks the most selective index
+        conn.execute('ANALYZE')
+        record_ingest(conn, 'full', total_rows, min_date, max_date, csv_offset, csv_path, keyed)
+        conn.execute('COMMIT')
 
-    print(f"✅ Created database with {len(df):,} rows")
+        for pragma in DEFAULT_PRAGMAS:
+            conn.execute(pragma)
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Created database with {total_rows:,} rows "
+          f"in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
 
-    conn.close()
     return True
 
 
-def run_query(query_name, query_sql):
-    """Execute SQL query and display results"""
+@traced()
+def refresh_database(csv_path=CSV_PATH, db_path=DB_PATH, chunksize=CHUNK_SIZE, compact=False):
+    """Ingest only the rows appended to the CSV since the last load
 
-    print(f"\n{'=' * 70}")
-    print(f"📊 {query_name}")
-    print('=' * 70)
+    New rows past the high-water mark are inserted and rows for dates
+    already loaded are upserted on (date, channel). Falls back to a full
+    rebuild when there is no prior state, the CSV was rewritten rather
+    than appended to, or the data has no (date, channel) key; compact only
+    applies to such a rebuild, as refreshes keep the stored columns.
+    """
 
-    conn = sqlite3.connect('data/marketing_analysis.db')
+    print("🔄 Refreshing SQLite database...")
+
+    if not os.path.exists(db_path):
+        return create_database(csv_path, db_path, chunksize, compact)
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
 
     try:
-        df = pd.read_sql_query(query_sql, conn)
-        print(df.to_string(index=False))
+        state = read_ingest_state(conn)
+        offset = int(state.get('csv_offset', -1))
+        size = os.path.getsize(csv_path)
 
-        # Save to CSV
-        output_file = f"data/analysis_{query_name.lower().replace(' ', '_')}.csv"
-        df.to_csv(output_file, index=False)
-        print(f"\n💾 Saved to: {output_file}")
+        if (offset < 0 or state.get('keyed') != '1' or size < offset
+                or state.get('csv_header') != read_csv_header(csv_path)
+                or state.get('csv_tail_hash') != csv_tail_hash(csv_path, offset)):
+            print("   CSV rewritten or no incremental state - rebuilding")
+            conn.close()
+            return create_database(csv_path, db_path, chunksize, compact)
 
-    except Exception as e:
-        print(f"❌ Error: {e}")
+        if size == offset:
+            print(f"✅ Already up to date (through {state.get('high_water_mark')})")
+            return True
 
-    conn.close()
+        high_water_mark = state.get('high_water_mark') or ''
+        names = state['csv_header'].split(',')
+        new_rows = corrected_rows = 0
+        min_date = max_date = None
+        months = set()
 
+        conn.execute('BEGIN')
+        with open(csv_path, 'rb') as csv_file:
+            csv_file.seek(offset)
+            for chunk in read_campaign_chunks(csv_file, chunksize, columns=table_columns(conn),
+                                              names=names):
+                insert_chunk(conn, chunk, upsert=True)
+                is_new = int((chunk['date'] > high_water_mark).sum())
+                new_rows += is_new
+                add_rows(len(chunk))
+                corrected_rows += len(chunk) - is_new
+                min_date = min(filter(None, [min_date, chunk['date'].min()]))
+                max_date = max(filter(None, [max_date, chunk['date'].max()]))
+                months.update(chunk['date'].str[:7].unique())
+            csv_offset = csv_file.tell()
 
-def main():
-    """Run all analysis queries"""
+        # Databases built before the view existed get it here
+        create_metrics_view(conn)
+        build_rollups(conn, months)
+        record_ingest(conn, 'incremental', new_rows + corrected_rows, min_date, max_date,
+                      csv_offset, csv_path, months=months)
+        conn.execute('COMMIT')
+        conn.execute('PRAGMA optimize')
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
 
-    # Create database
-    create_database()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Inserted {new_rows:,} new rows, upserted {corrected_rows:,} corrected rows "
+          f"in {elapsed * 1000:.1f} ms")
 
-    # Query 1: Overall Performance Summary
-    run_query("Overall Performance Summary", """
-                                             SELECT COUNT(DISTINCT date)                as total_days,
-                                                    COUNT(DISTINCT channel)             as total_channels,
-                                                    SUM(impressions)                    as total_impressions,
-                                                    SUM(clicks)                         as total_clicks,
-                                                    SUM(conversions)                    as total_conversions,
-                                                    ROUND(SUM(spend), 2)                as total_spend,
-                                                    ROUND(SUM(revenue), 2)              as total_revenue,
-                                                    ROUND(SUM(revenue) - SUM(spend), 2) as total_profit,
-                                                    ROUND(AVG(ctr), 2)                  as avg_ctr,
-                                                    ROUND(AVG(conversion_rate), 2)      as avg_conversion_rate,
-                                                    ROUND(SUM(revenue) / SUM(spend), 2) as overall_roas
-                                             FROM campaigns
-                                             """)
+    return True
 
-    # Query 2: Channel Performance
-    run_query("Channel Performance Comparison", """
-                                                SELECT channel,
-                                                       COUNT(*)                                                        as days_active,
-                                                       SUM(impressions)                                                as impressions,
-                                                       SUM(clicks)                                                     as clicks,
-                                                       SUM(conversions)                                                as conversions,
-                                                       ROUND(SUM(spend), 2)                                            as spend,
-                                                       ROUND(SUM(revenue), 2)                                          as revenue,
-                                                       ROUND(SUM(revenue) - SUM(spend), 2)                             as profit,
-                                                       ROUND(SUM(spend) / SUM(conversions), 2)                         as cac,
-                                                       ROUND(SUM(revenue) / SUM(spend), 2)                             as roas,
-                                                       ROUND((CAST(SUM(conversions) AS FLOAT) / SUM(clicks)) * 100, 2) as conversion_rate
-                                                FROM campaigns
-                                                WHERE conversions > 0
-                                                GROUP BY channel
-                                                ORDER BY roas DESC
-                                                """)
 
+# The report suite: name -> SQL. Each report reads the smallest rollup that answers it.
+REPORTS = {
+    # Query 1: Overall Performance Summary
+    "Overall Performance Summary": """
+        SELECT COUNT(DISTINCT date)                           as total_days,
+               COUNT(DISTINCT channel)                        as total_channels,
+               SUM(impressions)                               as total_impressions,
+               SUM(clicks)                                    as total_clicks,
+               SUM(conversions)                               as total_conversions,
+               ROUND(SUM(spend), 2)                           as total_spend,
+               ROUND(SUM(revenue), 2)                         as total_revenue,
+               ROUND(SUM(revenue) - SUM(spend), 2)            as total_profit,
+               ROUND(SUM(sum_ctr) / SUM(n_rows), 2)           as avg_ctr,
+               ROUND(SUM(sum_conversion_rate) / SUM(n_rows), 2) as avg_conversion_rate,
+               ROUND(SUM(revenue) / SUM(spend), 2)            as overall_roas
+        FROM rollup_daily_channel
+    """,
+    # Query 2: Channel Performance
+    "Channel Performance Comparison": """
+        SELECT channel,
+               SUM(n_rows)                                                     as days_active,
+               SUM(impressions)                                                as impressions,
+               SUM(clicks)                                                     as clicks,
+               SUM(conversions)                                                as conversions,
+               ROUND(SUM(spend), 2)                                            as spend,
+               ROUND(SUM(revenue), 2)                                          as revenue,
+               ROUND(SUM(revenue) - SUM(spend), 2)                             as profit,
+               ROUND(SUM(spend) / SUM(conversions), 2)                         as cac,
+               ROUND(SUM(revenue) / SUM(spend), 2)                             as roas,
+               ROUND((CAST(SUM(conversions) AS FLOAT) / SUM(clicks)) * 100, 2) as conversion_rate
+        FROM rollup_monthly_channel
+        WHERE converting = 1
+        GROUP BY channel
+        ORDER BY roas DESC
+    """,
     # Query 3: Underperforming Campaigns
-    run_query("Underperforming Campaigns (ROAS < 1.5)", """
-                                                        SELECT channel,
-                                                               campaign_type,
-                                                               SUM(conversions)                                                  as conversions,
-                                                               ROUND(SUM(spend), 2)                                              as spend,
-                                                               ROUND(SUM(revenue), 2)                                            as revenue,
-                                                               ROUND(SUM(revenue) / SUM(spend), 2)                               as roas,
-                                                               ROUND((SUM(spend) / (SELECT SUM(spend) FROM campaigns)) * 100, 2) as pct_of_total_spend
-                                                        FROM campaigns
-                                                        WHERE spend > 0
-                                                        GROUP BY channel, campaign_type
-                                                        HAVING ROUND(SUM(revenue) / SUM(spend), 2) < 1.5
-                                                        ORDER BY spend DESC LIMIT 10
-                                                        """)
-
+    "Underperforming Campaigns (ROAS < 1.5)": """
+        WITH total AS (SELECT SUM(spend) as spend FROM rollup_monthly_channel),
+             segments AS (SELECT channel,
+                                 campaign_type,
+                                 SUM(conversions)                    as conversions,
+                                 SUM(spend)                          as spend,
+                                 SUM(revenue)                        as revenue,
+                                 ROUND(SUM(revenue) / SUM(spend), 2) as roas
+                          FROM rollup_monthly_segment
+                          WHERE paid = 1
+                          GROUP BY channel, campaign_type)
+        SELECT channel,
+               campaign_type,
+               conversions,
+               ROUND(segments.spend, 2)                              as spend,
+               ROUND(revenue, 2)                                     as revenue,
+               roas,
+               ROUND((segments.spend / total.spend) * 100, 2)        as pct_of_total_spend
+        FROM segments, total
+        WHERE roas < 1.5
+        ORDER BY spend DESC LIMIT 10
+    """,
     # Query 4: Monthly Trends
-    run_query("Monthly Trend Analysis", """
-                                        SELECT strftime('%Y-%m', date) as month,
-            SUM(impressions) as impressions,
-            SUM(clicks) as clicks,
-            SUM(conversions) as conversions,
-            ROUND(SUM(spend), 2) as spend,
-            ROUND(SUM(revenue), 2) as revenue,
-            ROUND(SUM(revenue) / SUM(spend), 2) as roas,
-            ROUND((CAST(SUM(conversions) AS FLOAT) / SUM(clicks)) * 100, 2) as conversion_rate
-                                        FROM campaigns
-                                        GROUP BY month
-                                        ORDER BY month
-                                        """)
-
+    "Monthly Trend Analysis": """
+        SELECT month,
+               SUM(impressions)                                                as impressions,
+               SUM(clicks)                                                     as clicks,
+               SUM(conversions)                                                as conversions,
+               ROUND(SUM(spend), 2)                                            as spend,
+               ROUND(SUM(revenue), 2)                                          as revenue,
+               ROUND(SUM(revenue) / SUM(spend), 2)                             as roas,
+               ROUND((CAST(SUM(conversions) AS FLOAT) / SUM(clicks)) * 100, 2) as conversion_rate
+        FROM rollup_monthly_channel
+        GROUP BY month
+        ORDER BY month
+    """,
     # Query 5: Top Performers
-    run_query("Top Performing Campaigns (ROAS > 2.0)", """
-                                                       SELECT channel,
-                                                              campaign_type,
-                                                              product,
-                                                              SUM(conversions)                    as conversions,
-                                                              ROUND(SUM(spend), 2)                as spend,
-                                                              ROUND(SUM(revenue), 2)              as revenue,
-                                                              ROUND(SUM(revenue) / SUM(spend), 2) as roas
-                                                       FROM campaigns
-                                                       WHERE spend > 0
-                                                       GROUP BY channel, campaign_type, product
-                                                       HAVING ROUND(SUM(revenue) / SUM(spend), 2) > 2.0
-                                                       ORDER BY roas DESC LIMIT 15
-                                                       """)
+    "Top Performing Campaigns (ROAS > 2.0)": """
+        SELECT *
+        FROM (SELECT channel,
+                     campaign_type,
+                     product,
+                     SUM(conversions)                    as conversions,
+                     ROUND(SUM(spend), 2)                as spend,
+                     ROUND(SUM(revenue), 2)              as revenue,
+                     ROUND(SUM(revenue) / SUM(spend), 2) as roas
+              FROM rollup_monthly_segment
+              WHERE paid = 1
+              GROUP BY channel, campaign_type, product)
+        WHERE roas > 2.0
+        ORDER BY roas DESC LIMIT 15
+    """,
+    # Query 6: Rolling channel metrics as of each channel's latest day
+    "Rolling Channel Metrics (Latest 7 and 28 Days)": """
+        SELECT channel,
+               date,
+               ROUND(spend_7d, 2)    as spend_7d,
+               ROUND(revenue_7d, 2)  as revenue_7d,
+               ROUND(roas_7d, 2)     as roas_7d,
+               ROUND(cac_7d, 2)      as cac_7d,
+               ROUND(roas_28d, 2)    as roas_28d,
+               ROUND(cac_28d, 2)     as cac_28d,
+               ROUND(roas_7d_wow, 2) as roas_7d_wow,
+               ROUND(cac_7d_wow, 2)  as cac_7d_wow
+        FROM rolling_channel_metrics
+        WHERE (channel, date) IN (SELECT channel, MAX(date) FROM rolling_channel_metrics GROUP BY channel)
+        ORDER BY roas_7d DESC
+    """,
+}
+
+
+def data_fingerprint(conn):
+    """Identifies the loaded data: last batch, row count, high-water mark and load id"""
+
+    batch = conn.execute(
+        "SELECT batch_id, rows FROM ingest_log ORDER BY batch_id DESC LIMIT 1"
+    ).fetchone()
+    state = dict(conn.execute(
+        "SELECT key, value FROM ingest_state WHERE key IN ('high_water_mark', 'load_id')"
+    ))
+    return f"{batch}:{state.get('high_water_mark')}:{state.get('load_id')}"
+
+
+class ResultCache:
+    """Persistent query results keyed on normalized SQL plus a data fingerprint
+
+    Entries live in their own SQLite file and are evicted least recently
+    used first once their total size exceeds max_bytes.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key       TEXT PRIMARY KEY,
+                sql       TEXT    NOT NULL,
+                payload   BLOB    NOT NULL,
+                size      INTEGER NOT NULL,
+                last_used REAL    NOT NULL
+            )""")
+
+    @staticmethod
+    def key(sql, params, fingerprint):
+        """Cache key: whitespace-normalized SQL, parameters and data fingerprint"""
+
+        normalized = ' '.join(sql.split())
+        return hashlib.sha256(f"{normalized}\0{params!r}\0{fingerprint}".encode()).hexdigest()
+
+    def get(self, key):
+        """Cached DataFrame for a key, or None"""
+
+        with self.lock:
+            row = self.conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, sql, df):
+        """Store a result, then evict the least recently used entries over the size limit"""
+
+        payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.conn.execute('BEGIN')
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                              (key, sql, payload, len(payload), time.time()))
+            self.conn.execute("""
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC) as running
+                        FROM results
+                    ) WHERE running > ?
+                )""", (self.max_bytes,))
+            self.conn.execute('COMMIT')
+
+    def close(self):
+        self.conn.close()
+
+
+class QueryExecutor:
+    """Runs queries concurrently, each worker thread reusing one read-only connection
+
+    The database is in WAL mode after ingest, so readers never block each
+    other. CSV output is written by a separate single-thread pool so it
+    stays off the query path.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_workers=None, cache=None):
+        self.uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+        self.cache = cache
+        self.timings = {}
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or len(REPORTS))
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.writes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connection(self):
+        """This thread's read-only connection, opened on first use"""
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            conn.execute('PRAGMA query_only = ON')
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def query(self, sql, params=(), name=None):
+        """Run one query on the calling thread and return a DataFrame
+
+        While tracing, the query is recorded as a stage with its result
+        rows and SQLite's query plan, so full table scans show up.
+        """
+
+        if not enabled():
+            return pd.read_sql_query(sql, self.connection(), params=params)
+
+        plan = query_plan(self.connection(), sql, params)
+        with stage('query', report=name, plan=plan, full_scans=full_scans(plan)) as event:
+            df = pd.read_sql_query(sql, self.connection(), params=params)
+            event['rows'] = len(df)
+        return df
+
+    def submit(self, sql, params=(), name=None):
+        """Run one query on the pool; returns a Future of its DataFrame"""
+        return self.pool.submit(self.query, sql, params, name)
+
+    def run_all(self, queries):
+        """Run independent named queries concurrently; results keep the input order
+
+        With a result cache, unchanged results are served from it and only
+        misses reach the database. Per-query (hit, seconds) go to timings.
+        """
+
+        fingerprint = data_fingerprint(self.connection()) if self.cache else None
+        results, futures, keys = {}, {}, {}
+
+        for name, sql in queries.items():
+            start = time.perf_counter()
+            if self.cache:
+                keys[name] = ResultCache.key(sql, (), fingerprint)
+                results[name] = self.cache.get(keys[name])
+                if results[name] is not None:
+                    self.timings[name] = (True, time.perf_counter() - start)
+                    continue
+            futures[name] = (start, self.submit(sql, name=name))
+
+        for name, (start, future) in futures.items():
+            results[name] = future.result()
+            self.timings[name] = (False, time.perf_counter() - start)
+            if self.cache:
+                self.cache.put(keys[name], queries[name], results[name])
+
+        return {name: results[name] for name in queries}
+
+    def save_csv(self, df, path):
+        """Write a result to CSV in the background"""
+        self.writes.append(self.writer.submit(df.to_csv, path, index=False))
+
+    def close(self):
+        """Wait for pending CSV writes, then close the pools and connections"""
+
+        self.pool.shutdown()
+        self.writer.shutdown()
+        for write in self.writes:
+            write.result()
+        for conn in self.connections:
+            conn.close()
+
+
+def report_csv_path(query_name):
+    """Output CSV for a report: data/analysis_<name>.csv"""
+    return f"data/analysis_{query_name.lower().replace(' ', '_')}.csv"
+
+
+def run_query(query_name, query_sql=None, df=None, executor=None):
+    """Execute SQL query (unless its result is given), display it and save it to CSV
+
+    Returns the result DataFrame; query errors propagate to the caller.
+    """
+
+    if df is None:
+        if executor is None:
+            with QueryExecutor(max_workers=1) as own_executor:
+                return run_query(query_name, query_sql, executor=own_executor)
+        df = executor.query(query_sql, name=query_name)
+
+    print(f"\n{'=' * 70}")
+    print(f"📊 {query_name}")
+    print('=' * 70)
+    print(df.to_string(index=False))
+
+    # Save to CSV on every run, cache hits included: the file may hold another
+    # dataset's result, and the executor writes it off the critical path
+    output_file = report_csv_path(query_name)
+    if executor is None:
+        df.to_csv(output_file, index=False)
+    else:
+        executor.save_csv(df, output_file)
+    print(f"\n💾 Saved to: {output_file}")
+
+    return df
+
+
+def main(argv=None):
+    """Run all analysis queries"""
+
+    parser = argparse.ArgumentParser(description="Load campaign data into SQLite and run the reports")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only ingest rows appended to the CSV since the last run")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="recompute every report instead of reusing cached results")
+    parser.add_argument('--compact', action='store_true',
+                        help="store only the base measures; derived metrics come from the "
+                             "campaign_metrics view (automatic for a CSV without them)")
+    parser.add_argument('--partitions', action='store_true',
+                        help="also keep the month-partitioned copy in data/partitions/ in sync")
+    parser.add_argument('--trace', nargs='?', const=TRACE_PATH,
+                        help=f"record stage timings and query plans as JSON lines (default: {TRACE_PATH})")
+    parser.add_argument('--profile-dir', help="also write a cProfile .prof file per stage here")
+    args = parser.parse_args(argv)
+    configure(args.trace, args.profile_dir)
+
+    # Create or refresh database
+    if args.incremental:
+        refresh_database(compact=args.compact)
+    else:
+        create_database(compact=args.compact)
+
+    if args.partitions:
+        from partitions import sync_partitions
+
+        changed = sync_partitions()
+        print(f"🗂️  Rewrote {len(changed)} month partition(s)")
+
+    cache = None if args.no_cache else ResultCache()
+    try:
+        with QueryExecutor(cache=cache) as executor:
+            results = executor.run_all(REPORTS)
+            for name, df in results.items():
+                run_query(name, df=df, executor=executor)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    print("\n⏱️  Query timings")
+    for name, (hit, seconds) in executor.timings.items():
+        print(f"   {'⚡ hit ' if hit else '🔍 miss'} {seconds * 1000:8.1f} ms  {name}")
 
     print("\n" + "=" * 70)
     print("✅ ALL QUERIES COMPLETE!")